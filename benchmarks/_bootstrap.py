@@ -0,0 +1,82 @@
+"""Shared setup for the benchmark scripts.
+
+The plugin's __init__ needs a running NoneBot, Redis and a real checkpoint, so
+the model code is imported here as a bare package and the weights are randomly
+initialised from sample_config.json.
+"""
+import json
+import platform
+import sys
+import time
+import types
+from pathlib import Path
+
+import torch
+
+ROOT = Path(__file__).resolve().parent.parent
+PACKAGE = "nonebot_plugin_ds_baisuwen"
+SAMPLE_CONFIG = Path(__file__).resolve().parent / "sample_config.json"
+
+
+def load_package():
+    """Register the plugin as a namespace-like package without executing its __init__."""
+    if PACKAGE not in sys.modules:
+        pkg = types.ModuleType(PACKAGE)
+        pkg.__path__ = [str(ROOT / PACKAGE)]
+        sys.modules[PACKAGE] = pkg
+    return sys.modules[PACKAGE]
+
+
+def load_hparams(config_path=SAMPLE_CONFIG):
+    load_package()
+    from nonebot_plugin_ds_baisuwen import utils
+    return utils.get_hparams_from_file(str(config_path))
+
+
+def build_model(hps, seed=0):
+    """Randomly initialised SynthesizerTrn in eval mode."""
+    load_package()
+    from nonebot_plugin_ds_baisuwen.models import SynthesizerTrn
+    torch.manual_seed(seed)
+    net_g = SynthesizerTrn(
+        len(hps.symbols),
+        hps.data.filter_length // 2 + 1,
+        hps.train.segment_size // hps.data.hop_length,
+        n_speakers=hps.data.n_speakers,
+        **hps.model
+    )
+    return net_g.eval()
+
+
+def sample_inputs(hps, length, batch=1, seed=0):
+    """Random symbol IDs shaped like text_to_sequence output."""
+    generator = torch.Generator().manual_seed(seed)
+    x = torch.randint(1, len(hps.symbols), (batch, length), generator=generator)
+    x_lengths = torch.full((batch,), length, dtype=torch.long)
+    sid = torch.zeros(batch, dtype=torch.long)
+    return x, x_lengths, sid
+
+
+def timeit(fn, repeats=5, warmup=1):
+    """Mean/min wall time of fn() in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"mean_ms": sum(samples) / len(samples), "min_ms": min(samples)}
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "machine": platform.machine(),
+        "threads": torch.get_num_threads(),
+    }
+
+
+def dump(result):
+    print(json.dumps(result, indent=2, ensure_ascii=False))
@@ -0,0 +1,67 @@
+"""Banded inference path of attentions.MultiHeadAttention vs the padded
+relative-position reference path, on one encoder attention layer.
+
+Checks parity on random inputs with padding masks, then reports time and the
+bytes allocated by each path per call.
+
+    python benchmarks/bench_attention.py --lengths 8 64 256 1024
+"""
+import argparse
+import copy
+
+import torch
+from torch import nn
+from torch.profiler import ProfilerActivity, profile
+
+from _bootstrap import dump, environment, load_hparams, load_package, timeit
+
+
+def allocated_mb(fn):
+    """Total bytes allocated on the CPU while running fn(), in MB."""
+    with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+        fn()
+    return sum(max(evt.self_cpu_memory_usage, 0) for evt in prof.key_averages()) / 2**20
+
+
+def main():
+    load_package()
+    from nonebot_plugin_ds_baisuwen.attentions import MultiHeadAttention
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=None)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[3, 8, 64, 256, 1024])
+    parser.add_argument("--batch", type=int, default=2)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    hps = load_hparams(args.config) if args.config else load_hparams()
+    channels = hps.model.hidden_channels
+    torch.manual_seed(0)
+    banded = MultiHeadAttention(channels, channels, hps.model.n_heads, p_dropout=hps.model.p_dropout, window_size=4).eval()
+    # the reference path is the training one; drop dropout so the two are comparable
+    reference = copy.deepcopy(banded).train()
+    reference.drop = nn.Identity()
+
+    results = []
+    with torch.no_grad():
+        for length in args.lengths:
+            x = torch.randn(args.batch, channels, length)
+            lengths = torch.LongTensor([length] + [max(length * 2 // 3, 1)] * (args.batch - 1))
+            x_mask = (torch.arange(length)[None, :] < lengths[:, None]).unsqueeze(1).float()
+            attn_mask = x_mask.unsqueeze(2) * x_mask.unsqueeze(-1)
+
+            expected = reference(x, x, attn_mask) * x_mask
+            actual = banded(x, x, attn_mask) * x_mask
+            results.append({
+                "length": length,
+                "max_abs_diff": (actual - expected).abs().max().item(),
+                "reference": timeit(lambda: reference(x, x, attn_mask), args.repeats),
+                "banded": timeit(lambda: banded(x, x, attn_mask), args.repeats),
+                "reference_allocated_mb": allocated_mb(lambda: reference(x, x, attn_mask)),
+                "banded_allocated_mb": allocated_mb(lambda: banded(x, x, attn_mask)),
+            })
+    dump({"benchmark": "attention", "env": environment(), "batch": args.batch, "results": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""Load test for the chat handler without DeepSeek or a shared Redis.
+
+Loads the plugin under a NoneBot ~none driver and feeds synthetic OneBot v11
+GroupMessageEvent / PrivateMessageEvent objects through nonebot's
+handle_event, so the rule, rate limiter, history lookup and handle_chat all
+run as in production. Bot API calls are answered in-process and timestamped.
+DeepSeek is replaced by a local OpenAI-compatible server with configurable
+latency that can stream its answer as server-sent events (DeepSeekAPI does
+not ask for streaming, so --llm-stream always is only useful for a streaming
+client). Redis is
+fakeredis unless --redis-url points at a real one.
+
+Reports p50/p95/p99 latency to the first reply and to the end of handling,
+messages per second at the given concurrency, and the process's peak RSS
+(resource.getrusage, POSIX only) before the plugin is loaded, after the warmup
+and after the measured run.
+
+    python benchmarks/bench_chat_load.py --messages 500 --concurrency 32 --llm-latency-ms 800
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import socket
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from _bootstrap import ROOT, dump, environment
+
+BOT_ID = 10000
+USER_BASE = 200000
+GROUP_BASE = 300000
+PROMPTS = ["在吗", "今天吃什么", "帮我看看这段代码哪里错了", "讲个笑话吧", "你喜欢什么颜色"]
+
+
+class FakeOpenAI:
+    """Minimal OpenAI-compatible /v1/chat/completions server on asyncio streams.
+
+    Each request waits latency_ms (plus up to jitter_ms) before the first byte.
+    The reply is sent as server-sent events, one chunk per character group every
+    token_ms, when stream is "always" or when stream is "auto" and the request
+    asks for it with "stream": true.
+    """
+
+    def __init__(self, reply, latency_ms=500, jitter_ms=0, token_ms=20, chars_per_token=2, stream="auto", seed=0):
+        self.reply = reply
+        self.stream = stream
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.token_ms = token_ms
+        self.chars_per_token = chars_per_token
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._server = None
+
+    async def start(self, port):
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", port)
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        try:
+            method, path, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            if method != "POST" or not path.startswith("/v1/chat/completions"):
+                await self._write(writer, 404, "application/json", b'{"error": "not found"}')
+                return
+            request = json.loads(body or b"{}")
+            self.requests += 1
+            await asyncio.sleep((self.latency_ms + self._rng.uniform(0, self.jitter_ms)) / 1000)
+            if self.stream == "always" or (self.stream == "auto" and request.get("stream")):
+                await self._stream(writer, request)
+            else:
+                await self._write(writer, 200, "application/json", json.dumps(self._completion(request)).encode())
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def _completion(self, request):
+        return {
+            "id": f"chatcmpl-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": self.reply}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(self.reply), "total_tokens": len(self.reply)},
+        }
+
+    async def _stream(self, writer, request):
+        # no content-length: the body ends when the connection closes
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        for start in range(0, len(self.reply), self.chars_per_token):
+            chunk = {
+                "id": f"chatcmpl-{self.requests}",
+                "object": "chat.completion.chunk",
+                "model": request.get("model", "fake"),
+                "choices": [{"index": 0, "delta": {"content": self.reply[start:start + self.chars_per_token]}, "finish_reason": None}],
+            }
+            writer.write(b"data: " + json.dumps(chunk).encode() + b"\n\n")
+            await writer.drain()
+            await asyncio.sleep(self.token_ms / 1000)
+        writer.write(b"data: [DONE]\n\n")
+        await writer.drain()
+
+    @staticmethod
+    async def _write(writer, status, content_type, body):
+        reason = {200: "OK", 404: "Not Found"}[status]
+        writer.write(f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def load_plugin(llm_port, redis_url, voice):
+    """Initialise NoneBot, load the plugin and swap Redis for fakeredis when no URL is given."""
+    import nonebot
+
+    sys.path.insert(0, str(ROOT))
+    nonebot.init(
+        driver="~none",
+        deepseek_api_key="load-test",
+        deepseek_api_base=f"http://127.0.0.1:{llm_port}",
+        redis_url=redis_url or "redis://127.0.0.1:6379/0",
+    )
+    plugin = nonebot.load_plugin("nonebot_plugin_ds_baisuwen")
+    if plugin is None:
+        raise RuntimeError("failed to load nonebot_plugin_ds_baisuwen")
+    from nonebot_plugin_ds_baisuwen import message_handler, redis_handler
+    if not redis_url:
+        import fakeredis
+        redis_handler.redis_client.redis = fakeredis.aioredis.FakeRedis(decode_responses=False)
+    # the voice path calls the TTS API and the local model; off unless asked for
+    message_handler.CHARACTER["voice_enabled"] = voice
+    return nonebot.get_driver()
+
+
+def make_bot(driver, sent):
+    from nonebot.adapters.onebot.v11 import Adapter, Bot
+    from nonebot.internal.matcher import current_event
+
+    class RecordingAdapter(Adapter):
+        """Answers every API call in-process; send_msg calls are timestamped per event."""
+
+        async def _call_api(self, bot, api, **data):
+            event = current_event.get(None)
+            if api == "send_msg" and event is not None:
+                sent.setdefault(event.message_id, []).append((time.perf_counter(), str(data.get("message", ""))))
+            return {"message_id": len(sent)}
+
+    return Bot(RecordingAdapter(driver), str(BOT_ID))
+
+
+def make_event(i, is_group, groups):
+    from nonebot.adapters.onebot.v11 import GroupMessageEvent, Message, PrivateMessageEvent
+
+    text = PROMPTS[i % len(PROMPTS)]
+    user_id = USER_BASE + i  # one user per message, so the per-user rate limit does not kick in
+    fields = {
+        "time": int(time.time()),
+        "self_id": BOT_ID,
+        "post_type": "message",
+        "user_id": user_id,
+        "message_id": i,
+        "message": Message(text),
+        "original_message": Message(text),
+        "raw_message": text,
+        "font": 0,
+        "sender": {"user_id": user_id, "nickname": f"user{i}"},
+        "to_me": True,
+    }
+    if is_group:
+        group_id = GROUP_BASE + (i % groups if groups else i)
+        return GroupMessageEvent(message_type="group", sub_type="normal", group_id=group_id, **fields)
+    return PrivateMessageEvent(message_type="private", sub_type="friend", **fields)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MiB (None without the resource module)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    samples = sorted(samples)
+
+    def rank(p):
+        # nearest-rank percentile
+        return samples[max(math.ceil(p / 100 * len(samples)) - 1, 0)]
+
+    return {"p50_ms": rank(50), "p95_ms": rank(95), "p99_ms": rank(99), "max_ms": samples[-1], "count": len(samples)}
+
+
+async def drive(bot, events, concurrency, sent):
+    from nonebot.message import handle_event
+
+    semaphore = asyncio.Semaphore(concurrency)
+    started, handled = {}, {}
+
+    async def one(event):
+        async with semaphore:
+            started[event.message_id] = time.perf_counter()
+            await handle_event(bot, event)
+            handled[event.message_id] = time.perf_counter()
+
+    wall = time.perf_counter()
+    await asyncio.gather(*(one(event) for event in events))
+    wall = time.perf_counter() - wall
+
+    first_reply = [(sent[i][0][0] - started[i]) * 1000 for i in started if sent.get(i)]
+    done = [(handled[i] - started[i]) * 1000 for i in started]
+    replies = [sent[i][0][1] for i in started if sent.get(i)]
+    return {
+        "messages": len(events),
+        "replied": len(first_reply),
+        "rate_limited": sum("请求太频繁" in text for text in replies),
+        "errors": sum("消息发送失败" in text for text in replies),
+        "wall_s": wall,
+        "messages_per_s": len(events) / wall,
+        "first_reply": percentiles(first_reply),
+        "handled": percentiles(done),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def run(args):
+    llm_port = free_port()
+    reply = args.reply or "好呀，今天也要一起写代码哦~"
+    llm = FakeOpenAI(reply, args.llm_latency_ms, args.llm_jitter_ms, args.llm_token_ms,
+                     stream=args.llm_stream, seed=args.seed)
+    await llm.start(llm_port)
+    baseline_rss_mb = peak_rss_mb()
+    try:
+        driver = load_plugin(llm_port, args.redis_url, args.voice)
+        sent = {}
+        bot = make_bot(driver, sent)
+        rng = random.Random(args.seed)
+        kinds = [rng.random() < args.group_ratio for _ in range(args.warmup + args.messages)]
+        events = [make_event(i, is_group, args.groups) for i, is_group in enumerate(kinds)]
+        warmup_rss_mb = None
+        if args.warmup:
+            warmup_rss_mb = (await drive(bot, events[:args.warmup], args.concurrency, sent))["peak_rss_mb"]
+        result = await drive(bot, events[args.warmup:], args.concurrency, sent)
+        result["llm_requests"] = llm.requests
+        # ru_maxrss only grows, so the run's own share is the rise over the warmup
+        result["baseline_peak_rss_mb"] = baseline_rss_mb
+        result["warmup_peak_rss_mb"] = warmup_rss_mb
+        return result
+    finally:
+        await llm.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=5, help="messages sent first and left out of the report")
+    parser.add_argument("--group-ratio", type=float, default=0.5, help="share of group messages (the rest are private)")
+    parser.add_argument("--groups", type=int, default=0, help="distinct groups to spread group messages over (0: one per message)")
+    parser.add_argument("--llm-latency-ms", type=float, default=500, help="fake DeepSeek time to first byte")
+    parser.add_argument("--llm-jitter-ms", type=float, default=100)
+    parser.add_argument("--llm-token-ms", type=float, default=20, help="delay between streamed chunks")
+    parser.add_argument("--llm-stream", choices=["auto", "always", "never"], default="auto",
+                        help="answer as server-sent events: when the request asks for it, always or never")
+    parser.add_argument("--reply", default=None, help="text the fake DeepSeek answers with")
+    parser.add_argument("--redis-url", default=None, help="use this Redis instead of fakeredis")
+    parser.add_argument("--voice", action="store_true", help="keep voice replies on (needs the TTS API or the local model)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    dump({
+        "benchmark": "chat_load",
+        "env": environment(),
+        "config": {
+            "concurrency": args.concurrency,
+            "group_ratio": args.group_ratio,
+            "groups": args.groups,
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_jitter_ms": args.llm_jitter_ms,
+            "llm_stream": args.llm_stream,
+            "redis": args.redis_url or "fakeredis",
+            "voice": args.voice,
+        },
+        "results": result,
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Eager vs torch.compile inference of SynthesizerTrn on CPU.
+
+    python benchmarks/bench_compile.py --lengths 32 64 128 --repeats 5
+"""
+import argparse
+import time
+
+import torch
+
+from _bootstrap import build_model, dump, environment, load_hparams, sample_inputs, timeit
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=None)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[32, 64, 128, 256])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--backend", default="inductor")
+    args = parser.parse_args()
+
+    hps = load_hparams(args.config) if args.config else load_hparams()
+    net_g = build_model(hps).prepare_for_inference()
+    from nonebot_plugin_ds_baisuwen.inference import CompiledInfer
+
+    compiled = CompiledInfer(net_g, backend=args.backend)
+    results = []
+    with torch.no_grad():
+        for length in args.lengths:
+            x, x_lengths, sid = sample_inputs(hps, length)
+
+            def run(fn):
+                torch.manual_seed(0)
+                return fn(x, x_lengths, sid=sid)[0]
+
+            start = time.perf_counter()
+            compiled_out = run(compiled)
+            first_call_ms = (time.perf_counter() - start) * 1000
+            eager_out = run(net_g.infer)
+            results.append({
+                "length": length,
+                "eager": timeit(lambda: run(net_g.infer), args.repeats),
+                "compiled": timeit(lambda: run(compiled), args.repeats),
+                "compiled_first_call_ms": first_call_ms,
+                "compiled_active": compiled.is_compiled,
+                "max_abs_diff": (compiled_out - eager_out).abs().max().item()
+                if compiled_out.shape == eager_out.shape else None,
+            })
+    dump({"benchmark": "compile", "env": environment(), "results": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Duration expansion of the prior: commons.expand_by_duration (gather) vs the
+dense generate_path + matmul that infer(return_attn=True) still uses.
+
+Checks that the expansion is bit-exact and has the matmul result's memory
+layout, and that whole unseeded infer calls under the same global seed give
+identical audio on both paths (randn_like follows the layout of m_p). Exits
+non-zero when parity fails.
+
+    python benchmarks/bench_expand.py --tokens 50 400 --frames-per-token 6
+"""
+import argparse
+import sys
+
+import torch
+
+from _bootstrap import build_model, dump, environment, load_hparams, load_package, sample_inputs, timeit
+
+
+def dense_expand(commons, x, duration, t_y):
+    x_mask = (duration > 0).to(x.dtype)
+    y_mask = commons.sequence_mask(duration.sum([1, 2]).long(), t_y).unsqueeze(1).to(x.dtype)
+    attn = commons.generate_path(duration, x_mask.unsqueeze(2) * y_mask.unsqueeze(-1))
+    return torch.matmul(attn.squeeze(1), x.transpose(1, 2)).transpose(1, 2)
+
+
+def main():
+    load_package()
+    from nonebot_plugin_ds_baisuwen import commons
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=None)
+    parser.add_argument("--tokens", type=int, nargs="+", default=[50, 400])
+    parser.add_argument("--frames-per-token", type=int, default=6)
+    parser.add_argument("--batch", type=int, default=2)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[16, 64], help="symbol lengths for the infer check")
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    hps = load_hparams(args.config) if args.config else load_hparams()
+    channels = hps.model.inter_channels * 2  # m_p and logs_p are expanded together
+    generator = torch.Generator().manual_seed(0)
+    failed = False
+    expand = []
+    for tokens in args.tokens:
+        x = torch.randn(args.batch, channels, tokens, generator=generator)
+        duration = torch.randint(0, 2 * args.frames_per_token, (args.batch, 1, tokens), generator=generator).float()
+        duration[1:, :, tokens // 2:] = 0  # padded items
+        t_y = int(duration.sum([1, 2]).max())
+        reference = dense_expand(commons, x, duration, t_y)
+        optimized = commons.expand_by_duration(x, duration, t_y)
+        exact = torch.equal(reference, optimized) and reference.stride() == optimized.stride()
+        failed |= not exact
+        expand.append({
+            "tokens": tokens,
+            "frames": t_y,
+            "exact": exact,
+            "reference": timeit(lambda: dense_expand(commons, x, duration, t_y), args.repeats),
+            "optimized": timeit(lambda: commons.expand_by_duration(x, duration, t_y), args.repeats),
+        })
+
+    net_g = build_model(hps).prepare_for_inference()
+    infer = []
+    with torch.no_grad():
+        for length in args.lengths:
+            x, x_lengths, sid = sample_inputs(hps, length, batch=args.batch)
+            torch.manual_seed(0)
+            dense = net_g.infer(x, x_lengths, sid=sid, return_attn=True)[0]
+            torch.manual_seed(0)
+            gathered = net_g.infer(x, x_lengths, sid=sid)[0]
+            same = dense.shape == gathered.shape and torch.equal(dense, gathered)
+            failed |= not same
+            infer.append({"symbols": length, "identical_unseeded_audio": same})
+
+    dump({"benchmark": "expand", "env": environment(), "batch": args.batch, "expand": expand, "infer": infer})
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Inference build (prepare_for_inference + save_inference_checkpoint) vs the
+training checkpoint it is made from, on CPU.
+
+- size: the training checkpoint (with AdamW state, as train.py writes it) and
+  the inference checkpoint, as .pth and, if installed, .safetensors
+- load: SynthesizerTrn construction plus loading, the way VoiceService does it
+  for each file
+- infer: the model with weight norm and enc_q vs the prepared one (seeded, so
+  both synthesize the same frames), with their max abs difference
+- stale: the stored source matches the training checkpoint, and no longer
+  does after that file is rewritten
+
+Exits non-zero if the outputs differ or a rewritten source goes unnoticed.
+
+    python benchmarks/bench_inference_build.py --lengths 32 128
+"""
+import argparse
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import torch
+
+from _bootstrap import build_model, dump, environment, load_hparams, load_package, sample_inputs, timeit
+
+
+def training_checkpoint(net_g, path, utils):
+    """Save net_g with a populated AdamW state, like a checkpoint from training."""
+    optimizer = torch.optim.AdamW(net_g.parameters(), 2e-4, betas=(0.8, 0.99), eps=1e-9)
+    for p in net_g.parameters():
+        p.grad = torch.zeros_like(p)
+    optimizer.step()
+    optimizer.zero_grad(set_to_none=True)
+    utils.save_checkpoint(net_g, optimizer, 2e-4, 1000, str(path))
+
+
+def main():
+    load_package()
+    from nonebot_plugin_ds_baisuwen import utils
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=None)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[32, 128])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=1e-4)
+    args = parser.parse_args()
+
+    hps = load_hparams(args.config) if args.config else load_hparams()
+    try:
+        import safetensors  # noqa: F401
+        formats = [".pth", ".safetensors"]
+    except ImportError:
+        formats = [".pth"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        full_path = Path(tmp) / "G_1000.pth"
+        reference = build_model(hps)
+        training_checkpoint(reference, full_path, utils)
+        source = utils.checkpoint_source(str(full_path))
+        prepared = build_model(hps)
+        utils.load_checkpoint(str(full_path), prepared)
+        prepared.prepare_for_inference()
+        inference_paths = {}
+        for suffix in formats:
+            inference_paths[suffix] = Path(tmp) / ("G_inference" + suffix)
+            utils.save_inference_checkpoint(prepared, inference_paths[suffix], 1000, source=source)
+
+        def load_full():
+            net_g = build_model(hps)
+            utils.load_checkpoint(str(full_path), net_g)
+            return net_g.prepare_for_inference()
+
+        def load_inference(path):
+            net_g = build_model(hps).prepare_for_inference()
+            utils.load_inference_checkpoint(str(path), net_g)
+            return net_g
+
+        sizes = {"training": full_path.stat().st_size}
+        load = {"training": timeit(load_full, args.repeats)}
+        for suffix, path in inference_paths.items():
+            sizes["inference" + suffix] = path.stat().st_size
+            load["inference" + suffix] = timeit(lambda: load_inference(path), args.repeats)
+
+        failed = False
+        infer = []
+        with torch.no_grad():
+            for length in args.lengths:
+                x, x_lengths, sid = sample_inputs(hps, length)
+
+                def run(net_g):
+                    return net_g.infer(x, x_lengths, sid=sid, generator=torch.Generator().manual_seed(0))[0]
+
+                max_abs_diff = (run(reference) - run(prepared)).abs().max().item()
+                failed |= max_abs_diff > args.tolerance
+                infer.append({
+                    "symbols": length,
+                    "max_abs_diff": max_abs_diff,
+                    "training": timeit(lambda: run(reference), args.repeats),
+                    "inference": timeit(lambda: run(prepared), args.repeats),
+                })
+
+        stale = {"current_matches": all(
+            utils.inference_checkpoint_source(str(path)) == source for path in inference_paths.values())}
+        # a retrained model written to the same path
+        training_checkpoint(build_model(hps, seed=1), full_path, utils)
+        os.utime(full_path, ns=(source["mtime_ns"] + 10**9, source["mtime_ns"] + 10**9))
+        stale["rewritten_detected"] = all(
+            utils.inference_checkpoint_source(str(path)) != utils.checkpoint_source(str(full_path))
+            for path in inference_paths.values())
+        failed |= not (stale["current_matches"] and stale["rewritten_detected"])
+
+    dump({
+        "benchmark": "inference_build",
+        "env": environment(),
+        "size_mb": {name: size / 2**20 for name, size in sizes.items()},
+        "load": load,
+        "infer": infer,
+        "stale": stale,
+    })
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Cross-check and time the monotonic_align implementations (compiled Cython
+extension, numba, numpy) on random batches shaped like training alignments.
+
+Every implementation must produce the same path as the first one available and
+a valid monotonic alignment; the script exits non-zero otherwise. The torch
+wrappers (maximum_path, MaximumPath with and without inplace) are timed over
+sizes around MaximumPath.min_numel, below which MaximumPath uses maximum_path.
+
+    python benchmarks/bench_monotonic_align.py --batch 16 --frames 400 --text 120
+"""
+import argparse
+import importlib
+import sys
+
+import numpy as np
+import torch
+
+from _bootstrap import dump, environment, load_package, timeit
+
+IMPLEMENTATIONS = ["core", "numba_core", "numpy_core"]
+
+
+def available():
+    impls = {}
+    for name in IMPLEMENTATIONS:
+        try:
+            module = importlib.import_module("nonebot_plugin_ds_baisuwen.monotonic_align." + name)
+        except ImportError as e:
+            print(f"{name}: unavailable ({e})", file=sys.stderr)
+            continue
+        impls[name] = module.maximum_path_c
+    return impls
+
+
+def random_case(rng, batch, frames, text):
+    t_ys = rng.integers(max(frames // 2, 1), frames + 1, batch).astype(np.int32)
+    t_xs = np.minimum(rng.integers(max(text // 2, 1), text + 1, batch), t_ys).astype(np.int32)
+    t_ys[0], t_xs[0] = frames, min(text, frames)  # one item spans the padded shape
+    values = rng.standard_normal((batch, frames, text)).astype(np.float32) * 10
+    return values, t_ys, t_xs
+
+
+def run(fn, values, t_ys, t_xs):
+    values = values.copy()
+    paths = np.zeros(values.shape, dtype=np.int32)
+    fn(paths, values, t_ys, t_xs)
+    return paths
+
+
+def is_valid_path(path, t_y, t_x):
+    """One text position per frame, starting at 0, ending at t_x - 1, advancing by 0 or 1."""
+    if path[t_y:].any() or path[:, t_x:].any():
+        return False
+    if not (path[:t_y].sum(1) == 1).all():
+        return False
+    index = path[:t_y].argmax(1)
+    return index[0] == 0 and index[-1] == t_x - 1 and set(np.diff(index)) <= {0, 1}
+
+
+def main():
+    load_package()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--frames", type=int, default=400)
+    parser.add_argument("--text", type=int, default=120)
+    parser.add_argument("--cases", type=int, default=20, help="random batches for the correctness check")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    impls = available()
+    rng = np.random.default_rng(0)
+    reference_name = next(iter(impls))
+    mismatches = {name: 0 for name in impls}
+    invalid = {name: 0 for name in impls}
+    for case in range(args.cases):
+        # small shapes exercise t_x == t_y, single-frame and single-token edges
+        shape = (args.batch, args.frames, args.text) if case % 2 else (4, rng.integers(1, 12), rng.integers(1, 12))
+        values, t_ys, t_xs = random_case(rng, *shape)
+        expected = run(impls[reference_name], values, t_ys, t_xs)
+        for name, fn in impls.items():
+            paths = run(fn, values, t_ys, t_xs)
+            mismatches[name] += int(not np.array_equal(paths, expected))
+            invalid[name] += sum(not is_valid_path(p, ty, tx) for p, ty, tx in zip(paths, t_ys, t_xs))
+
+    values, t_ys, t_xs = random_case(rng, args.batch, args.frames, args.text)
+    for fn in impls.values():
+        run(fn, values, t_ys, t_xs)  # numba compiles on the first call
+    results = {
+        name: {
+            "mismatched_batches": mismatches[name],
+            "invalid_paths": invalid[name],
+            **timeit(lambda: run(fn, values, t_ys, t_xs), args.repeats),
+        }
+        for name, fn in impls.items()
+    }
+
+    # torch-level wrappers: per-call allocation vs reused buffers / in-place DP
+    from nonebot_plugin_ds_baisuwen.monotonic_align import BACKEND, MaximumPath, maximum_path
+    wrappers = []
+    matches = True
+    for shape in [(4, 50, 20), (4, 100, 40), (8, 200, 60), (args.batch, args.frames, args.text)]:
+        values, t_ys, t_xs = random_case(rng, *shape)
+        neg_cent = torch.from_numpy(values)
+        mask = torch.zeros(values.shape)
+        for i, (t_y, t_x) in enumerate(zip(t_ys, t_xs)):
+            mask[i, :t_y, :t_x] = 1
+        expected = maximum_path(neg_cent, mask)
+        # forced onto the buffered path, to compare it with maximum_path at every size
+        buffered = MaximumPath()
+        buffered.min_numel = 0
+        matches &= bool(torch.equal(buffered(neg_cent.clone(), mask, inplace=True), expected))
+        matches &= bool(torch.equal(MaximumPath()(neg_cent.clone(), mask, inplace=True), expected))
+        wrappers.append({
+            "shape": list(shape),
+            "uses_buffers": neg_cent.numel() >= MaximumPath.min_numel,
+            "maximum_path": timeit(lambda: maximum_path(neg_cent, mask), args.repeats),
+            "buffered": timeit(lambda: buffered(neg_cent, mask), args.repeats),
+            # includes the clone that keeps neg_cent intact between repeats
+            "buffered_inplace": timeit(lambda: buffered(neg_cent.clone(), mask, inplace=True), args.repeats),
+        })
+    dump({
+        "benchmark": "monotonic_align",
+        "env": environment(),
+        "shape": [args.batch, args.frames, args.text],
+        "reference": reference_name,
+        "results": results,
+        "backend": BACKEND,
+        "wrappers": wrappers,
+        "wrappers_match": matches,
+    })
+    if any(mismatches.values()) or any(invalid.values()) or not matches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""torch vs onnxruntime inference of SynthesizerTrn on CPU, with a parity check.
+
+    python benchmarks/bench_onnx.py --lengths 32 64 128 --intra-threads 4
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+import torch
+
+from _bootstrap import build_model, dump, environment, load_hparams, sample_inputs, timeit
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=None)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[32, 64, 128, 256])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--intra-threads", type=int, default=0)
+    parser.add_argument("--inter-threads", type=int, default=1)
+    args = parser.parse_args()
+
+    hps = load_hparams(args.config) if args.config else load_hparams()
+    net_g = build_model(hps).prepare_for_inference()
+    from nonebot_plugin_ds_baisuwen.inference import OnnxInfer, check_onnx_parity, export_onnx
+
+    with tempfile.TemporaryDirectory() as tmp:
+        onnx_path = Path(tmp) / "vits.onnx"
+        export_onnx(net_g, onnx_path)
+        onnx_infer = OnnxInfer(onnx_path, args.intra_threads, args.inter_threads)
+        results = []
+        with torch.no_grad():
+            for length in args.lengths:
+                x, x_lengths, sid = sample_inputs(hps, length)
+                results.append({
+                    "length": length,
+                    "torch": timeit(lambda: net_g.infer(
+                        x, x_lengths, sid=sid, generator=torch.Generator().manual_seed(0)), args.repeats),
+                    "onnxruntime": timeit(lambda: onnx_infer(x, x_lengths, sid=sid), args.repeats),
+                })
+        parity = check_onnx_parity(net_g, onnx_infer, lengths=args.lengths)
+    dump({
+        "benchmark": "onnx",
+        "env": environment(),
+        "onnx_threads": {"intra": args.intra_threads, "inter": args.inter_threads},
+        "max_abs_diff": parity,
+        "results": results,
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""Timings for the whole local TTS path, as one JSON report to diff between commits.
+
+- text: text_to_sequence for each cleaner, on 1x and 4x its sample text
+- stages: TextEncoder, duration predictor, flows and Generator of a randomly
+  initialised SynthesizerTrn, over symbol lengths and batch sizes
+- voice_service: VoiceService._local_generate (synthesis plus silk encoding)
+  and its synthesis step alone over text lengths, and _synthesize_batch over
+  batch sizes, with a random checkpoint saved from sample_config.json. Silk
+  files go to a temporary directory; _local_generate is only timed when ffmpeg
+  and the encoder (--silk-encoder) are there and the first encode succeeds,
+  otherwise the report says why it was skipped
+
+Noise is seeded, so every run synthesizes the same number of frames. Sections
+whose dependencies are missing (text frontends, nonebot) report why instead.
+
+    python benchmarks/bench_pipeline.py --output pipeline.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+import torch
+
+from _bootstrap import (
+    ROOT, SAMPLE_CONFIG, build_model, dump, environment, load_hparams, load_package, sample_inputs, timeit)
+
+# one sample per cleaner, in the markup the cleaner expects
+CLEANER_SAMPLES = {
+    "chinese_cleaners": "[ZH]今天天气不错，我们去公园散步吧。[ZH]",
+    "japanese_cleaners": "今日はいい天気ですね。",
+    "japanese_cleaners2": "今日はいい天気ですね。",
+    "korean_cleaners": "오늘은 날씨가 좋네요.",
+    "cjks_cleaners": "[ZH]今天天气不错。[ZH][JA]いい天気ですね。[JA][KO]날씨가 좋네요.[KO]",
+    "cjke_cleaners": "[ZH]今天天气不错。[ZH][JA]いい天気ですね。[JA][EN]Nice weather today.[EN]",
+    "cjke_cleaners2": "[ZH]今天天气不错。[ZH][JA]いい天気ですね。[JA][EN]Nice weather today.[EN]",
+    "sanskrit_cleaners": "[SA]नमस्ते[SA]",
+    "thai_cleaners": "วันนี้อากาศดี",
+}
+REPLY = "今天天气不错，我们去公园散步吧。"
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def reply_of(chars):
+    return (REPLY * (chars // len(REPLY) + 1))[:chars]
+
+
+def bench_text(hps, repeats):
+    from nonebot_plugin_ds_baisuwen.text import text_to_sequence
+
+    results = {}
+    for cleaner, sample in CLEANER_SAMPLES.items():
+        # text_to_sequence prints the cleaned text; keep stdout for the report
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[cleaner] = [
+                    {
+                        "chars": len(text),
+                        "symbols": len(text_to_sequence(text, hps.symbols, [cleaner])),
+                        **timeit(lambda: text_to_sequence(text, hps.symbols, [cleaner]), repeats),
+                    }
+                    for text in (sample, sample * 4)
+                ]
+        except Exception as e:
+            results[cleaner] = {"unavailable": f"{type(e).__name__}: {e}"}
+    return results
+
+
+def bench_stages(hps, lengths, batch_sizes, repeats):
+    net_g = build_model(hps).prepare_for_inference()
+    results = []
+    with torch.no_grad():
+        for batch in batch_sizes:
+            for length in lengths:
+                x, x_lengths, sid = sample_inputs(hps, length, batch=batch)
+                x_enc, m_p, logs_p, x_mask = net_g.enc_p(x, x_lengths)
+                cond = net_g.speaker_conditioning(sid)
+                dp_cond = cond and cond.dp
+
+                def duration():
+                    generator = torch.Generator().manual_seed(0)
+                    if net_g.use_sdp:
+                        return net_g.dp(x_enc, x_mask, reverse=True, g_cond=dp_cond, generator=generator)
+                    return net_g.dp(x_enc, x_mask, g_cond=dp_cond)
+
+                z, _, y_mask, cond, (z_p, _, _) = net_g._infer_latent(
+                    x, x_lengths, sid, 1., 1., 1., generator=torch.Generator().manual_seed(0))
+                flow_conds, dec_cond = cond and cond.flows, cond and cond.dec
+                results.append({
+                    "batch": batch,
+                    "symbols": length,
+                    "frames": int(y_mask.size(2)),
+                    "text_encoder": timeit(lambda: net_g.enc_p(x, x_lengths), repeats),
+                    "duration_predictor": timeit(duration, repeats),
+                    "flow": timeit(lambda: net_g.flow(z_p, y_mask, reverse=True, g_conds=flow_conds), repeats),
+                    "generator": timeit(lambda: net_g.dec(z * y_mask, g_cond=dec_cond), repeats),
+                    "infer": timeit(lambda: net_g.infer(
+                        x, x_lengths, sid=sid, generator=torch.Generator().manual_seed(0)), repeats),
+                })
+    return results
+
+
+def load_voice_service(tmp, config_path, overrides):
+    """Import voice_service under a NoneBot without adapters, pointed at a random checkpoint.
+    Redis is configured but never contacted: only the chunk cache uses it."""
+    import nonebot
+    nonebot.init(driver="~none", redis_url="redis://127.0.0.1:6379/0")
+
+    from nonebot_plugin_ds_baisuwen import config_loader, utils
+    hps = load_hparams(config_path)
+    checkpoint = Path(tmp) / "G_random.pth"
+    utils.save_checkpoint(build_model(hps), None, 0.0, 0, str(checkpoint))
+    load_config = config_loader.load_character_config
+    config_loader.load_character_config = lambda: {
+        **load_config(),
+        "vits_model_path": str(checkpoint),
+        "vits_config_path": str(config_path),
+        "vits_speaker": 0,
+        "vits_seed": 0,
+        **overrides,
+    }
+    from nonebot_plugin_ds_baisuwen import voice_service
+    return voice_service.voice_service
+
+
+def silk_skip_reason(service):
+    """Why _local_generate cannot produce a silk file here, or None."""
+    if shutil.which("ffmpeg") is None:
+        return "ffmpeg not found on PATH"
+    if not service.silk_encoder_path.exists():
+        return f"silk encoder not found: {service.silk_encoder_path} (pass --silk-encoder)"
+    return None
+
+
+def bench_voice_service(config_path, text_lengths, batch_sizes, repeats, overrides, silk_encoder):
+    loop = asyncio.new_event_loop()
+    with tempfile.TemporaryDirectory() as tmp:
+        service = load_voice_service(tmp, config_path, overrides)
+        # keep the encoder's output out of the configured record directory
+        service.record_dir = Path(tmp) / "record"
+        if silk_encoder:
+            service.silk_encoder_path = Path(silk_encoder).resolve()
+        skipped = silk_skip_reason(service)
+        loop.run_until_complete(service._start_loading())
+        if not loop.run_until_complete(service.wait_ready()):
+            raise RuntimeError(f"model failed to load ({service.state})")
+        voice = service.get_voice()
+        generate, results = [], []
+        for chars in text_lengths:
+            text = reply_of(chars)
+            with contextlib.redirect_stdout(io.StringIO()):
+                entry = {
+                    "chars": chars,
+                    "synthesis": timeit(lambda: loop.run_until_complete(service._run_synthesis(text, voice, 0)), repeats),
+                }
+                if skipped is None and loop.run_until_complete(service._local_generate(text, voice, 0)) is None:
+                    skipped = "silk encoding failed, see the log"
+                if skipped is None:
+                    entry["local_generate"] = timeit(
+                        lambda: loop.run_until_complete(service._local_generate(text, voice, 0)), repeats)
+                generate.append(entry)
+        for batch in batch_sizes:
+            texts = [reply_of(16 + 8 * i) for i in range(batch)]
+            with contextlib.redirect_stdout(io.StringIO()):
+                results.append({"batch": batch, **timeit(lambda: service._synthesize_batch(texts), repeats)})
+        loop.run_until_complete(service._shutdown_workers())
+    loop.close()
+    return {"local_generate": generate, "local_generate_skipped": skipped, "synthesize_batch": results}
+
+
+def section(fn, *args):
+    try:
+        return fn(*args)
+    except Exception as e:
+        return {"unavailable": f"{type(e).__name__}: {e}"}
+
+
+def main():
+    load_package()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=None)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[16, 64, 256], help="symbol lengths for the stages")
+    parser.add_argument("--text-lengths", type=int, nargs="+", default=[8, 32, 128], help="reply lengths in characters")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--sections", nargs="+", default=["text", "stages", "voice_service"])
+    parser.add_argument("--vits-config", default="{}", help="JSON of vits_* overrides for the voice_service section")
+    parser.add_argument("--silk-encoder", default=None, help="silk_v3_encoder to time _local_generate with")
+    parser.add_argument("--output", default=None, help="also write the report to this file")
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    hps = load_hparams(args.config) if args.config else load_hparams()
+    report = {"benchmark": "pipeline", "commit": git_commit(), "env": environment()}
+    if "text" in args.sections:
+        report["text"] = section(bench_text, hps, args.repeats)
+    if "stages" in args.sections:
+        report["stages"] = section(bench_stages, hps, args.lengths, args.batch_sizes, args.repeats)
+    if "voice_service" in args.sections:
+        report["voice_service"] = section(
+            bench_voice_service, args.config or SAMPLE_CONFIG, args.text_lengths, args.batch_sizes, args.repeats, json.loads(args.vits_config),
+            args.silk_encoder)
+    dump(report)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""fp32 vs reduced-precision (autocast) inference of SynthesizerTrn on CPU:
+speed, max waveform difference and mel distance against fp32.
+
+    python benchmarks/bench_precision.py --dtype bfloat16 --lengths 32 64 128
+"""
+import argparse
+
+import torch
+
+from _bootstrap import build_model, dump, environment, load_hparams, sample_inputs, timeit
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=None)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[32, 64, 128, 256])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--dtype", default="bfloat16", choices=["bfloat16", "float16"])
+    args = parser.parse_args()
+
+    hps = load_hparams(args.config) if args.config else load_hparams()
+    net_g = build_model(hps).prepare_for_inference()
+    from nonebot_plugin_ds_baisuwen.inference import AutocastInfer, mel_distance
+
+    reduced = AutocastInfer(net_g.infer, "cpu", getattr(torch, args.dtype))
+    results = []
+    with torch.no_grad():
+        for length in args.lengths:
+            x, x_lengths, sid = sample_inputs(hps, length)
+
+            def run(fn):
+                return fn(x, x_lengths, sid=sid, noise_scale=0., noise_scale_w=0.)[0]
+
+            fp32_out, reduced_out = run(net_g.infer), run(reduced)
+            fp32_time = timeit(lambda: run(net_g.infer), args.repeats)
+            reduced_time = timeit(lambda: run(reduced), args.repeats)
+            results.append({
+                "length": length,
+                "fp32": fp32_time,
+                args.dtype: reduced_time,
+                "speedup": fp32_time["mean_ms"] / reduced_time["mean_ms"],
+                "same_length": fp32_out.shape == reduced_out.shape,
+                "max_abs_diff": (fp32_out - reduced_out).abs().max().item()
+                if fp32_out.shape == reduced_out.shape else None,
+                "mel_distance": mel_distance(fp32_out, reduced_out, hps.data.sampling_rate,
+                                             hps.data.filter_length, hps.data.hop_length),
+            })
+    dump({"benchmark": "precision", "env": environment(), "dtype": args.dtype, "results": results})
+
+
+if __name__ == "__main__":
+    main()
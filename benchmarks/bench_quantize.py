@@ -0,0 +1,68 @@
+"""fp32 vs int8 inference of SynthesizerTrn on CPU: speed, weight size and
+mel distance of the int8 output against fp32.
+
+    python benchmarks/bench_quantize.py --lengths 32 64 128 --quantize-resblocks
+"""
+import argparse
+import copy
+import io
+
+import torch
+
+from _bootstrap import build_model, dump, environment, load_hparams, sample_inputs, timeit
+
+# token lengths of typical short chat replies after add_blank
+CALIBRATION_LENGTHS = [24, 40, 64, 96]
+
+
+def state_dict_bytes(model):
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=None)
+    parser.add_argument("--lengths", type=int, nargs="+", default=[32, 64, 128, 256])
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--quantize-resblocks", action="store_true")
+    args = parser.parse_args()
+
+    hps = load_hparams(args.config) if args.config else load_hparams()
+    net_g = build_model(hps).prepare_for_inference()
+    from nonebot_plugin_ds_baisuwen.inference import mel_distance, quantize_int8
+
+    calibration = [sample_inputs(hps, length, seed=i) for i, length in enumerate(CALIBRATION_LENGTHS)]
+    int8 = quantize_int8(copy.deepcopy(net_g), calibration, quantize_resblocks=args.quantize_resblocks)
+
+    results = []
+    with torch.no_grad():
+        for length in args.lengths:
+            x, x_lengths, sid = sample_inputs(hps, length, seed=100 + length)
+
+            def run(model):
+                return model.infer(x, x_lengths, sid=sid, noise_scale=0., noise_scale_w=0.)[0]
+
+            fp32_time = timeit(lambda: run(net_g), args.repeats)
+            int8_time = timeit(lambda: run(int8), args.repeats)
+            results.append({
+                "length": length,
+                "fp32": fp32_time,
+                "int8": int8_time,
+                "speedup": fp32_time["mean_ms"] / int8_time["mean_ms"],
+                "mel_distance": mel_distance(run(net_g), run(int8), hps.data.sampling_rate,
+                                             hps.data.filter_length, hps.data.hop_length),
+            })
+    fp32_bytes, int8_bytes = state_dict_bytes(net_g), state_dict_bytes(int8)
+    dump({
+        "benchmark": "quantize",
+        "env": environment(),
+        "quantize_resblocks": args.quantize_resblocks,
+        "weights_bytes": {"fp32": fp32_bytes, "int8": int8_bytes, "reduction": 1 - int8_bytes / fp32_bytes},
+        "results": results,
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Rational-quadratic spline of transforms.py (torch.searchsorted, elementwise
+softmax, torch.where for the linear tails) against the previous mask/scatter version,
+which is kept below as the reference.
+
+Checks forward and inverse outputs, log-determinants and gradients against the
+reference run in fp64, on inputs shaped like ConvFlow's (including values in
+the tails and on the tail bounds), then times both. Exits non-zero when parity
+fails.
+
+    python benchmarks/bench_spline.py --frames 64 512 2048
+"""
+import argparse
+import sys
+
+import numpy as np
+import torch
+from torch.nn import functional as F
+
+from _bootstrap import dump, environment, load_package, timeit
+
+
+def reference_searchsorted(bin_locations, inputs, eps=1e-6):
+    bin_locations[..., -1] += eps
+    return torch.sum(inputs[..., None] >= bin_locations, dim=-1) - 1
+
+
+def reference_spline(inputs, unnormalized_widths, unnormalized_heights, unnormalized_derivatives,
+                     inverse=False, tail_bound=1., min_bin_width=1e-3, min_bin_height=1e-3, min_derivative=1e-3):
+    """unconstrained_rational_quadratic_spline + rational_quadratic_spline as they were."""
+    inside = (inputs >= -tail_bound) & (inputs <= tail_bound)
+    outputs = torch.zeros_like(inputs)
+    logabsdet = torch.zeros_like(inputs)
+    unnormalized_derivatives = F.pad(unnormalized_derivatives, pad=(1, 1))
+    constant = np.log(np.exp(1 - min_derivative) - 1)
+    unnormalized_derivatives[..., 0] = constant
+    unnormalized_derivatives[..., -1] = constant
+    outputs[~inside] = inputs[~inside]
+
+    x, uw, uh, ud = inputs[inside], unnormalized_widths[inside, :], unnormalized_heights[inside, :], unnormalized_derivatives[inside, :]
+    left, right, bottom, top = -tail_bound, tail_bound, -tail_bound, tail_bound
+    num_bins = uw.shape[-1]
+    widths = min_bin_width + (1 - min_bin_width * num_bins) * F.softmax(uw, dim=-1)
+    cumwidths = (right - left) * F.pad(torch.cumsum(widths, dim=-1), pad=(1, 0), mode='constant', value=0.0) + left
+    cumwidths[..., 0] = left
+    cumwidths[..., -1] = right
+    widths = cumwidths[..., 1:] - cumwidths[..., :-1]
+    derivatives = min_derivative + F.softplus(ud)
+    heights = min_bin_height + (1 - min_bin_height * num_bins) * F.softmax(uh, dim=-1)
+    cumheights = (top - bottom) * F.pad(torch.cumsum(heights, dim=-1), pad=(1, 0), mode='constant', value=0.0) + bottom
+    cumheights[..., 0] = bottom
+    cumheights[..., -1] = top
+    heights = cumheights[..., 1:] - cumheights[..., :-1]
+
+    bin_idx = reference_searchsorted(cumheights if inverse else cumwidths, x)[..., None]
+    input_cumwidths = cumwidths.gather(-1, bin_idx)[..., 0]
+    input_bin_widths = widths.gather(-1, bin_idx)[..., 0]
+    input_cumheights = cumheights.gather(-1, bin_idx)[..., 0]
+    delta = heights / widths
+    input_delta = delta.gather(-1, bin_idx)[..., 0]
+    input_derivatives = derivatives.gather(-1, bin_idx)[..., 0]
+    input_derivatives_plus_one = derivatives[..., 1:].gather(-1, bin_idx)[..., 0]
+    input_heights = heights.gather(-1, bin_idx)[..., 0]
+    slope_sum = input_derivatives + input_derivatives_plus_one - 2 * input_delta
+
+    if inverse:
+        a = (x - input_cumheights) * slope_sum + input_heights * (input_delta - input_derivatives)
+        b = input_heights * input_derivatives - (x - input_cumheights) * slope_sum
+        c = - input_delta * (x - input_cumheights)
+        theta = (2 * c) / (-b - torch.sqrt(b.pow(2) - 4 * a * c))
+        out = theta * input_bin_widths + input_cumwidths
+    else:
+        theta = (x - input_cumwidths) / input_bin_widths
+    theta_one_minus_theta = theta * (1 - theta)
+    denominator = input_delta + slope_sum * theta_one_minus_theta
+    if not inverse:
+        out = input_cumheights + input_heights * (input_delta * theta.pow(2) + input_derivatives * theta_one_minus_theta) / denominator
+    derivative_numerator = input_delta.pow(2) * (input_derivatives_plus_one * theta.pow(2)
+                                                 + 2 * input_delta * theta_one_minus_theta
+                                                 + input_derivatives * (1 - theta).pow(2))
+    lad = torch.log(derivative_numerator) - 2 * torch.log(denominator)
+    outputs[inside], logabsdet[inside] = out, (-lad if inverse else lad)
+    return outputs, logabsdet
+
+
+def make_inputs(batch, frames, num_bins, tail_bound, seed):
+    generator = torch.Generator().manual_seed(seed)
+    x = torch.randn(batch, 1, frames, generator=generator) * tail_bound
+    # both tail bounds exactly, the centre and one value in the tail
+    x[0, 0, :4] = torch.tensor([-tail_bound, tail_bound, 0.0, tail_bound * 1.5])
+    h = torch.randn(batch, 1, frames, num_bins * 3 - 1, generator=generator)
+    return x, h[..., :num_bins], h[..., num_bins:2 * num_bins], h[..., 2 * num_bins:]
+
+
+def outputs_and_grads(fn, args, inverse, dtype=torch.float32):
+    params = [a.to(dtype).clone().requires_grad_(True) for a in args[1:]]
+    outputs, logabsdet = fn(args[0].to(dtype), *params, inverse=inverse)
+    (outputs.sum() + logabsdet.sum()).backward()
+    return outputs.detach(), logabsdet.detach(), torch.cat([p.grad.flatten() for p in params])
+
+
+def compare(fn, ref, args, inverse):
+    """Errors of fn and of the fp32 reference against the reference run in fp64
+    (gradients relative to their largest magnitude)."""
+    exact = outputs_and_grads(ref, args, inverse, torch.float64)
+    scales = (1.0, 1.0, exact[2].abs().max().item())
+    parity = {}
+    for prefix, result in (("", outputs_and_grads(fn, args, inverse)), ("reference_", outputs_and_grads(ref, args, inverse))):
+        for name, value, expected, scale in zip(("outputs_error", "logabsdet_error", "grad_error"), result, exact, scales):
+            parity[prefix + name] = (value - expected).abs().max().item() / scale
+    return parity
+
+
+def within_tolerance(parity, tolerance):
+    """No worse than twice the fp32 reference's own rounding error (or tolerance)."""
+    return all(parity[name] <= max(2 * parity["reference_" + name], tolerance)
+               for name in ("outputs_error", "logabsdet_error", "grad_error"))
+
+
+def main():
+    load_package()
+    from nonebot_plugin_ds_baisuwen import transforms
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, nargs="+", default=[64, 512, 2048])
+    parser.add_argument("--batch", type=int, default=2)
+    parser.add_argument("--num-bins", type=int, default=10)
+    parser.add_argument("--tail-bound", type=float, default=5.0)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=1e-4)
+    args = parser.parse_args()
+
+    def spline(x, w, h, d, inverse=False):
+        return transforms.piecewise_rational_quadratic_transform(
+            x, w, h, d, inverse=inverse, tails="linear", tail_bound=args.tail_bound)
+
+    def reference(x, w, h, d, inverse=False):
+        return reference_spline(x, w, h, d, inverse=inverse, tail_bound=args.tail_bound)
+
+    results = []
+    failed = False
+    for frames in args.frames:
+        inputs = make_inputs(args.batch, frames, args.num_bins, args.tail_bound, seed=frames)
+        entry = {"frames": frames}
+        for direction, inverse in (("forward", False), ("inverse", True)):
+            parity = compare(spline, reference, inputs, inverse)
+            failed |= not within_tolerance(parity, args.tolerance)
+            with torch.no_grad():
+                entry[direction] = {
+                    **parity,
+                    "reference": timeit(lambda: reference(*inputs, inverse=inverse), args.repeats),
+                    "optimized": timeit(lambda: spline(*inputs, inverse=inverse), args.repeats),
+                }
+        results.append(entry)
+    dump({"benchmark": "spline", "env": environment(), "batch": args.batch, "results": results})
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Worker/thread sizing for VoiceService on this machine.
+
+Each layout runs `workers` forked processes, each pinned to its own group of
+cores with `intra` torch threads, all synthesizing concurrently. The report
+gives per-job latency and overall throughput for every layout, and recommends
+the vits_workers / vits_intra_threads settings with the best throughput.
+
+    python benchmarks/bench_threads.py --cores 8 --reserve 1 --jobs 4
+"""
+import argparse
+import multiprocessing
+import time
+
+import torch
+
+from _bootstrap import build_model, dump, environment, load_hparams, load_package, sample_inputs
+
+_model = None
+_inputs = None
+
+
+def _worker(cpus, intra, jobs, results):
+    from nonebot_plugin_ds_baisuwen.inference import configure_threads, pin_to_cpus
+
+    pin_to_cpus(cpus)
+    configure_threads(intra)
+    x, x_lengths, sid = _inputs
+    latencies = []
+    with torch.no_grad():
+        for _ in range(jobs):
+            start = time.perf_counter()
+            # same noise every job, so every job synthesizes the same number of frames
+            _model.infer(x, x_lengths, sid=sid, generator=torch.Generator().manual_seed(0))
+            latencies.append((time.perf_counter() - start) * 1000)
+    results.put(latencies)
+
+
+def run_layout(ctx, cpu_groups, intra, jobs):
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(cpus, intra, jobs, results)) for cpus in cpu_groups]
+    start = time.perf_counter()
+    for proc in procs:
+        proc.start()
+    latencies = [lat for _ in procs for lat in results.get()]
+    for proc in procs:
+        proc.join()
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "workers": len(cpu_groups),
+        "intra_threads": intra,
+        "cpu_groups": cpu_groups,
+        "latency_p50_ms": latencies[len(latencies) // 2],
+        "latency_max_ms": latencies[-1],
+        "throughput_per_s": len(latencies) / wall,
+    }
+
+
+def main():
+    global _model, _inputs
+    load_package()
+    from nonebot_plugin_ds_baisuwen.inference import available_cpus, plan_cpu_affinity
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=None)
+    parser.add_argument("--cores", type=int, default=None, help="cores to size for (default: all available)")
+    parser.add_argument("--reserve", type=int, default=1, help="cores kept free for the event loop")
+    parser.add_argument("--length", type=int, default=96)
+    parser.add_argument("--jobs", type=int, default=4, help="utterances per worker")
+    args = parser.parse_args()
+
+    if "fork" not in multiprocessing.get_all_start_methods():
+        raise SystemExit("bench_threads needs the fork start method (Linux)")
+    cpus = available_cpus()[:args.cores] if args.cores else available_cpus()
+    usable = max(len(cpus) - args.reserve, 1)
+
+    hps = load_hparams(args.config) if args.config else load_hparams()
+    _model = build_model(hps).prepare_for_inference()
+    _inputs = sample_inputs(hps, args.length)
+
+    ctx = multiprocessing.get_context("fork")
+    layouts = []
+    workers = 1
+    while workers <= usable:
+        cpu_groups = plan_cpu_affinity(workers, cpus, reserve=args.reserve)
+        layouts.append(run_layout(ctx, cpu_groups, len(cpu_groups[0]), args.jobs))
+        workers *= 2
+
+    best = max(layouts, key=lambda layout: layout["throughput_per_s"])
+    fastest = min(layouts, key=lambda layout: layout["latency_p50_ms"])
+    dump({
+        "benchmark": "threads",
+        "env": environment(),
+        "cores": len(cpus),
+        "reserved": args.reserve,
+        "text_length": args.length,
+        "layouts": layouts,
+        "recommended": {
+            "vits_worker_mode": "process" if best["workers"] > 1 else "thread",
+            "vits_workers": best["workers"],
+            "vits_intra_threads": best["intra_threads"],
+            "vits_reserved_cpus": args.reserve,
+        },
+        "lowest_latency": {"vits_workers": fastest["workers"], "vits_intra_threads": fastest["intra_threads"]},
+    })
+
+
+if __name__ == "__main__":
+    main()
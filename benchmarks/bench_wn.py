@@ -0,0 +1,97 @@
+"""Inference path of modules.WN (in-place gate, no zero conditioning, two
+buffers per call) vs the autograd-friendly forward, for the WN shapes of the
+flows and the posterior encoder, with and without speaker conditioning.
+
+Reports parity, time and the bytes allocated per call, and the in-place gate
+of the inference path against commons.fused_add_tanh_sigmoid_multiply, the
+TorchScript gate the regular forward uses.
+
+    python benchmarks/bench_wn.py --frames 200 800
+"""
+import argparse
+
+import torch
+
+from _bootstrap import dump, environment, load_hparams, load_package, timeit
+from bench_attention import allocated_mb
+
+
+def main():
+    load_package()
+    from nonebot_plugin_ds_baisuwen import commons
+    from nonebot_plugin_ds_baisuwen.modules import WN
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=None)
+    parser.add_argument("--frames", type=int, nargs="+", default=[200, 800])
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    hps = load_hparams(args.config) if args.config else load_hparams()
+    model = hps.model
+    gin_channels = model.gin_channels if hps.data.n_speakers > 1 else 0
+    layouts = {
+        "flow": (model.hidden_channels, 5, 1, 4),
+        "posterior_encoder": (model.hidden_channels, 5, 1, 16),
+    }
+
+    results, gates = [], []
+    with torch.no_grad():
+        for name, (channels, kernel_size, dilation_rate, n_layers) in layouts.items():
+            for gin in sorted({0, gin_channels}):
+                torch.manual_seed(0)
+                wn = WN(channels, kernel_size, dilation_rate, n_layers, gin_channels=gin)
+                wn.remove_weight_norm()
+                for frames in args.frames:
+                    x = torch.randn(args.batch, channels, frames)
+                    x_mask = torch.ones(args.batch, 1, frames)
+                    x_mask[:, :, frames * 3 // 4:] = 0
+                    g = torch.randn(args.batch, gin, 1) if gin else None
+
+                    def reference():
+                        # train mode takes the regular path; WN has no dropout here
+                        return wn.train()(x, x_mask, g=g)
+
+                    def optimized():
+                        return wn.eval()(x, x_mask, g=g)
+
+                    results.append({
+                        "layout": name,
+                        "n_layers": n_layers,
+                        "conditioned": bool(gin),
+                        "frames": frames,
+                        "max_abs_diff": (optimized() - reference()).abs().max().item(),
+                        "reference": timeit(reference, args.repeats),
+                        "optimized": timeit(optimized, args.repeats),
+                        "reference_allocated_mb": allocated_mb(reference),
+                        "optimized_allocated_mb": allocated_mb(optimized),
+                    })
+        channels = model.hidden_channels
+        n_channels = torch.IntTensor([channels])
+        for frames in args.frames:
+            x_in = torch.randn(args.batch, 2 * channels, frames)
+            g_l = torch.randn(args.batch, 2 * channels, 1)
+
+            def fused():
+                return commons.fused_add_tanh_sigmoid_multiply(x_in, g_l, n_channels)
+
+            def in_place():
+                # the clone stands in for the conv output _infer gates in place
+                x = x_in.clone().add_(g_l)
+                return torch.tanh_(x[:, :channels, :]).mul_(torch.sigmoid_(x[:, channels:, :]))
+
+            fused()  # TorchScript specializes on the first calls
+            gates.append({
+                "frames": frames,
+                "max_abs_diff": (in_place() - fused()).abs().max().item(),
+                "fused": timeit(fused, args.repeats),
+                "in_place": timeit(in_place, args.repeats),
+                "fused_allocated_mb": allocated_mb(fused),
+                "in_place_allocated_mb": allocated_mb(in_place),
+            })
+    dump({"benchmark": "wn", "env": environment(), "batch": args.batch, "results": results, "gate": gates})
+
+
+if __name__ == "__main__":
+    main()
@@ -63,6 +63,27 @@ async def handle_voice_switch(event: MessageEvent, arg: Message = CommandArg()):
         msg = "无效的命令，请使用 `/语音模式 on` 或 `/语音模式 off` 来切换语音回复."
     await voice_switch.finish(msg)
 
+voice_metrics = on_command(
+    "语音性能",
+    aliases={"voice_metrics"},
+    priority=5,
+    permission=SUPERUSER
+)
+
+@voice_metrics.handle()
+async def handle_voice_metrics():
+    stages = voice_service.stage_metrics()
+    if not stages:
+        await voice_metrics.finish("暂无统计，请在配置中开启 vits_profile 后再合成几句语音~")
+    lines = ["阶段 | 次数 | 均值 | p50 | p95 | p99 (ms)"]
+    for name, metrics in stages.items():
+        t = metrics["time_ms"]
+        line = f"{name} | {t['count']} | {t['mean']:.1f} | {t['p50']:.1f} | {t['p95']:.1f} | {t['p99']:.1f}"
+        if "peak_mb" in metrics:
+            line += f" | 显存峰值p95 {metrics['peak_mb']['p95']:.0f}MB"
+        lines.append(line)
+    await voice_metrics.finish("\n".join(lines))
+
 @chat.handle()
 async def handle_chat(event: MessageEvent):
     try:
@@ -87,7 +108,8 @@ async def handle_chat(event: MessageEvent):
         
         if CHARACTER["voice_enabled"] and voice_service:
             try:
-                silk_path = await voice_service.text_to_speech(response)
+                voice = voice_service.voice_for(getattr(event, "group_id", None))
+                silk_path = await voice_service.text_to_speech(response, voice)
                 if silk_path and silk_path.exists():
                     # 使用URL编码路径
                     file_url = f"file:///{silk_path.as_posix()}"
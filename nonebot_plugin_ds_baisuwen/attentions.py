@@ -153,12 +153,21 @@ class MultiHeadAttention(nn.Module):
     value = value.view(b, self.n_heads, self.k_channels, t_s).transpose(2, 3)
 
     scores = torch.matmul(query / math.sqrt(self.k_channels), key.transpose(-2, -1))
+    # at inference the relative terms are computed on the 2*window_size+1
+    # diagonals only, instead of through [b, h, t, 2t-1] padded tensors.
+    # The diagonal loop is specialised to the traced length, so tracing (onnx
+    # export) keeps the padded path.
+    banded = self.window_size is not None and not self.training and not torch.jit.is_tracing()
     if self.window_size is not None:
       assert t_s == t_t, "Relative attention is only available for self-attention."
-      key_relative_embeddings = self._get_relative_embeddings(self.emb_rel_k, t_s)
-      rel_logits = self._matmul_with_relative_keys(query /math.sqrt(self.k_channels), key_relative_embeddings)
-      scores_local = self._relative_position_to_absolute_position(rel_logits)
-      scores = scores + scores_local
+      if banded:
+        rel_logits = self._matmul_with_relative_keys(query / math.sqrt(self.k_channels), self.emb_rel_k)
+        scores = self._add_relative_band(scores, rel_logits)
+      else:
+        key_relative_embeddings = self._get_relative_embeddings(self.emb_rel_k, t_s)
+        rel_logits = self._matmul_with_relative_keys(query /math.sqrt(self.k_channels), key_relative_embeddings)
+        scores_local = self._relative_position_to_absolute_position(rel_logits)
+        scores = scores + scores_local
     if self.proximal_bias:
       assert t_s == t_t, "Proximal bias is only available for self-attention."
       scores = scores + self._attention_bias_proximal(t_s).to(device=scores.device, dtype=scores.dtype)
@@ -171,7 +180,10 @@ class MultiHeadAttention(nn.Module):
     p_attn = F.softmax(scores, dim=-1) # [b, n_h, t_t, t_s]
     p_attn = self.drop(p_attn)
     output = torch.matmul(p_attn, value)
-    if self.window_size is not None:
+    if banded:
+      relative_weights = self._relative_band(p_attn)
+      output = output + self._matmul_with_relative_values(relative_weights, self.emb_rel_v)
+    elif self.window_size is not None:
       relative_weights = self._absolute_position_to_relative_position(p_attn)
       value_relative_embeddings = self._get_relative_embeddings(self.emb_rel_v, t_s)
       output = output + self._matmul_with_relative_values(relative_weights, value_relative_embeddings)
@@ -242,6 +254,32 @@ class MultiHeadAttention(nn.Module):
     x_final = x_flat.view([batch, heads, length, 2*length])[:,:,:,1:]
     return x_final
 
+  def _band_offsets(self, length):
+    """Relative positions r of the window, with the rows i that have a column i + r."""
+    for r in range(-min(self.window_size, length - 1), min(self.window_size, length - 1) + 1):
+      yield r, max(-r, 0), length - max(r, 0)
+
+  def _add_relative_band(self, scores, band):
+    """
+    scores: [b, h, l, l]
+    band: [b, h, l, 2*w+1], band[..., i, w+r] is the logit of column i+r
+    ret: scores with the band added along its diagonals (in place)
+    """
+    for r, start, end in self._band_offsets(scores.size(-1)):
+      scores.diagonal(offset=r, dim1=-2, dim2=-1).add_(band[:, :, start:end, self.window_size + r])
+    return scores
+
+  def _relative_band(self, x):
+    """
+    x: [b, h, l, l]
+    ret: [b, h, l, 2*w+1], ret[..., i, w+r] = x[..., i, i+r], zero outside x
+    """
+    batch, heads, length, _ = x.size()
+    ret = x.new_zeros(batch, heads, length, 2 * self.window_size + 1)
+    for r, start, end in self._band_offsets(length):
+      ret[:, :, start:end, self.window_size + r] = x.diagonal(offset=r, dim1=-2, dim2=-1)
+    return ret
+
   def _attention_bias_proximal(self, length):
     """Bias for self-attention to encourage attention to close positions.
     Args:
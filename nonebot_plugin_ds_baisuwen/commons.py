@@ -45,6 +45,24 @@ def rand_gumbel_like(x):
   return g
 
 
+def randn(shape, generator=None, mask=None):
+  """Standard normal noise [b, c, t] on the CPU, from generator when one is given.
+  generator may also be a list with one generator per batch item. With mask [b, 1, t]
+  each item draws only its valid frames and the padding is zero, so padding does not
+  move the generator: in a batch with per-item generators each item gets the noise it
+  would get alone.
+  generator=None is not passed on: torch.compile cannot trace it with dynamic shapes."""
+  if generator is None:
+    return torch.randn(shape)
+  b, c, t = shape
+  generators = generator if isinstance(generator, (list, tuple)) else [generator] * b
+  lengths = [t] * b if mask is None else mask.sum([1, 2]).long().tolist()
+  noise = torch.zeros(b, t, c)
+  for i, (g, length) in enumerate(zip(generators, lengths)):
+    noise[i, :length] = torch.randn((length, c), generator=g)
+  return noise.transpose(1, 2)
+
+
 def slice_segments(x, ids_str, segment_size=4):
   ret = torch.zeros_like(x[:, :, :segment_size])
   for i in range(x.size(0)):
@@ -146,6 +164,27 @@ def generate_path(duration, mask):
   return path
 
 
+def expand_by_duration(x, duration, t_y):
+  """
+  Same as matmul(generate_path(duration, mask).squeeze(1), x.transpose(1, 2)).transpose(1, 2)
+  without the dense [b, t_y, t_x] path: each frame gathers the token covering it.
+  x: [b, c, t_x]
+  duration: [b, 1, t_x], whole frames, zero on padding
+  ret: [b, c, t_y], zero past each item's total duration. Laid out in memory as
+  [b, t_y, c] like the matmul result, so randn_like draws the same noise for it.
+  """
+  b, c, t_x = x.shape
+  cum_duration = torch.cumsum(duration.squeeze(1).long(), -1) # [b, t_x]
+  # frame j belongs to token #{k : cum_duration[k] <= j}; count by scattering token ends
+  ends = torch.zeros(b, t_y + 1, dtype=torch.long, device=x.device)
+  ends.scatter_add_(1, cum_duration.clamp(max=t_y), torch.ones_like(cum_duration))
+  index = torch.cumsum(ends, -1)[:, :t_y] # [b, t_y]
+  frame_mask = index < t_x
+  index = index.clamp(max=t_x - 1)
+  y = torch.gather(x.transpose(1, 2), 1, index.unsqueeze(2).expand(b, t_y, c)) # [b, t_y, c]
+  return (y * frame_mask.unsqueeze(2).to(x.dtype)).transpose(1, 2)
+
+
 def clip_grad_value_(parameters, clip_value, norm_type=2):
   if isinstance(parameters, torch.Tensor):
     parameters = [parameters]
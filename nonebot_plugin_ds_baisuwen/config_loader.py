@@ -2,6 +2,21 @@ import json
 from pathlib import Path
 from typing import Dict, Any
 
+# 数值型vits_*配置的取值范围：语速参与除法必须为正，时长上限0为不限制
+_VITS_RANGES = {
+    "vits_length_scale": lambda v: v > 0,
+    "vits_max_duration": lambda v: v >= 0,
+}
+
+def _check_vits_config(config: Dict[str, Any], default_config: Dict[str, Any]) -> Dict[str, Any]:
+    """取值不合法的vits_*配置回退默认值，避免每次合成时才报错"""
+    for key, valid in _VITS_RANGES.items():
+        value = config.get(key)
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not valid(value):
+            print(f"配置项 {key}={value!r} 不合法，使用默认值 {default_config[key]}")
+            config[key] = default_config[key]
+    return config
+
 def load_character_config() -> Dict[str, Any]:
     config_path = Path(__file__).parent.parent.parent / "data" / "qq.json"
     
@@ -26,6 +41,38 @@ def load_character_config() -> Dict[str, Any]:
         "voice_enabled": True,
         "vits_model_path": "D:/VITS/.../G_latest.pth",
         "vits_config_path": "D:/VITS/.../config.json",
+        "vits_speaker": "rosmontic",  # 默认音色的说话人（名称或编号）
+        "vits_voices": {},  # 其他音色: {名称: {model_path, config_path, speaker, inference_model_path, onnx_path}}，未填字段沿用默认
+        "vits_voice": "default",  # 角色使用的音色
+        "vits_group_voices": {},  # 按群指定音色: {群号: 音色名}
+        "vits_model_memory_mb": 0,  # 同时驻留模型的内存预算，超出按最近最少使用卸载，0为不限制
+        "vits_load_wait": 0,  # 备用模型后台加载完成前，语音请求最多等待的秒数，超时仅回复文字
+        "vits_seed": None,  # 本地合成的噪声种子，固定后同一文本的音频逐位一致；None为每次随机
+        "vits_length_scale": 1.0,  # 语速（时长缩放），大于1变慢，API模式同样使用
+        "vits_noise_scale": 1.0,  # 本地合成的先验噪声强度
+        "vits_noise_scale_w": 1.0,  # 本地合成的时长噪声强度
+        "vits_max_duration": 0,  # 单条语音时长上限（秒），超出的文本合成前截断，0为不限制
+        "vits_inference_model_path": "",  # 推理精简版权重路径，不存在时由完整权重自动生成
+        "vits_backend": "torch",  # 推理后端: torch / onnx
+        "vits_onnx_path": "",  # onnx模型路径，不存在时自动导出
+        "vits_onnx_intra_threads": 0,  # onnxruntime算子内线程数，0为自动
+        "vits_onnx_inter_threads": 1,  # onnxruntime算子间线程数
+        "vits_quantize": False,  # CPU int8量化
+        "vits_quantize_resblocks": False,  # 声码器残差块卷积也量化
+        "vits_compile": False,  # torch.compile 编译推理，失败自动回退
+        "vits_precision": "fp32",  # 推理精度: fp32 / bf16 / fp16
+        "vits_workers": 1,  # 推理工作者数量
+        "vits_worker_mode": "thread",  # 工作者类型: thread / process（需fork，仅Linux）
+        "vits_intra_threads": 0,  # 每个工作者的torch算子内线程数，0为默认
+        "vits_interop_threads": 0,  # torch算子间线程数，0为默认
+        "vits_cpu_affinity": True,  # 进程工作者按CPU分组绑定
+        "vits_reserved_cpus": 1,  # 留给事件循环、不参与绑定的CPU数
+        "vits_chunked_synthesis": False,  # 按句分段合成
+        "vits_chunk_workers": 1,  # 同时合成的分句数
+        "vits_crossfade_ms": 20,  # 分句拼接交叉淡化时长
+        "vits_streaming_decode": False,  # 声码器流式解码，边合成边转码
+        "vits_stream_chunk_frames": 64,  # 流式解码每块的隐变量帧数
+        "vits_profile": False,  # 统计本地推理各阶段耗时（/语音性能 查看）
         "response_rules": {
             "max_tokens":256
         }
@@ -34,7 +81,7 @@ def load_character_config() -> Dict[str, Any]:
     try:
         with open(config_path, 'r', encoding='utf-8') as f:
             user_config = json.load(f)
-        return {**default_config, **user_config}
+        return _check_vits_config({**default_config, **user_config}, default_config)
     except Exception as e:
         print(f"配置加载失败，使用默认配置: {str(e)}")
         return default_config
\ No newline at end of file
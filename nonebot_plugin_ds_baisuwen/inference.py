@@ -0,0 +1,327 @@
+import logging
+import math
+import os
+
+import torch
+from torch import nn
+from torch.ao import quantization
+
+logger = logging.getLogger(__name__)
+
+
+def configure_threads(intra_op_threads=0, inter_op_threads=0):
+    """Size torch's intra-op and inter-op thread pools; 0 leaves a pool as it is.
+    The inter-op pool can only be sized before torch runs any parallel work."""
+    if intra_op_threads > 0:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads > 0:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError as e:
+            logger.warning("cannot set inter-op threads after parallel work started: %s", e)
+
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def plan_cpu_affinity(n_workers, cpus=None, reserve=0):
+    """Split cpus into n_workers contiguous groups, leaving the first `reserve`
+    cpus to the event loop. Groups wrap around when there are more workers than cpus."""
+    cpus = sorted(cpus if cpus is not None else available_cpus())
+    if len(cpus) > reserve:
+        cpus = cpus[reserve:]
+    size = max(len(cpus) // n_workers, 1)
+    groups = []
+    for i in range(n_workers):
+        start = (i * size) % len(cpus)
+        groups.append(cpus[start:start + size])
+    return groups
+
+
+def pin_to_cpus(cpus):
+    """Pin the calling process to cpus, where the platform supports it."""
+    if not hasattr(os, "sched_setaffinity"):
+        logger.warning("cpu affinity is not supported on this platform")
+        return
+    os.sched_setaffinity(0, cpus)
+
+
+class CompiledInfer:
+    """SynthesizerTrn.infer behind torch.compile with dynamic sequence length.
+    Falls back to eager for good if compilation or a compiled call fails."""
+
+    def __init__(self, model, backend="inductor", mode=None):
+        self.model = model
+        self.compiled = None
+        if not hasattr(torch, "compile"):
+            logger.warning("torch.compile is unavailable, using eager inference")
+            return
+        try:
+            self.compiled = torch.compile(model.infer, dynamic=True, backend=backend, mode=mode)
+        except Exception as e:
+            logger.warning("torch.compile failed, using eager inference: %s", e)
+
+    def __call__(self, *args, **kwargs):
+        if self.compiled is not None:
+            try:
+                return self.compiled(*args, **kwargs)
+            except Exception as e:
+                logger.warning("compiled inference failed, falling back to eager: %s", e)
+                self.compiled = None
+        return self.model.infer(*args, **kwargs)
+
+    @property
+    def is_compiled(self):
+        return self.compiled is not None
+
+
+class AutocastInfer:
+    """Runs an infer callable under reduced-precision autocast (bf16 by default)
+    and hands the waveform back in fp32. Duration exp and the spline transforms
+    opt out of autocast and stay fp32."""
+
+    def __init__(self, infer, device_type="cpu", dtype=torch.bfloat16):
+        self.infer = infer
+        self.device_type = device_type
+        self.dtype = dtype
+
+    def __call__(self, *args, **kwargs):
+        with torch.autocast(device_type=self.device_type, dtype=self.dtype):
+            o, attn, y_mask, latents = self.infer(*args, **kwargs)
+        return o.float(), attn, y_mask, latents
+
+
+class _OnnxInferGraph(torch.nn.Module):
+    """infer with the sampling scales packed into one tensor input, as onnx needs,
+    and max_len as a float input (inf for no cap). The durations are truncated in
+    the graph, so the cap bounds the flow and decoder like it does in torch; infer's
+    final slice is left out, it would be traced as a constant."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, x, x_lengths, sid, scales, max_frames):
+        z, _, y_mask, cond, _ = self.model._infer_latent(
+            x, x_lengths, sid, scales[0], scales[1], scales[2], max_len=max_frames)
+        o = self.model.dec(z * y_mask, g_cond=cond and cond.dec)
+        return o, y_mask
+
+
+def export_onnx(model, onnx_path, opset_version=17, metadata=None):
+    """Export the inference graph of a SynthesizerTrn (text encoder, duration
+    predictor, path expansion, reverse flow and decoder) with dynamic batch and
+    text length. Prepare the model with prepare_for_inference() first.
+    metadata (str -> str) is stored in the model's metadata_props and comes
+    back as OnnxInfer.metadata."""
+    length = 50
+    x = torch.randint(1, model.n_vocab, (1, length))
+    x_lengths = torch.LongTensor([length])
+    sid = torch.zeros(1, dtype=torch.long)
+    scales = torch.FloatTensor([0.667, 1.0, 0.8])
+    max_frames = torch.tensor(float("inf"))
+    with torch.no_grad():
+        torch.onnx.export(
+            _OnnxInferGraph(model).eval(),
+            (x, x_lengths, sid, scales, max_frames),
+            str(onnx_path),
+            input_names=["x", "x_lengths", "sid", "scales", "max_frames"],
+            output_names=["audio", "y_mask"],
+            dynamic_axes={
+                "x": {0: "batch", 1: "text_length"},
+                "x_lengths": {0: "batch"},
+                "sid": {0: "batch"},
+                "audio": {0: "batch", 2: "audio_length"},
+                "y_mask": {0: "batch", 2: "frames"},
+            },
+            opset_version=opset_version,
+            dynamo=False,
+        )
+    if metadata:
+        import onnx
+
+        onnx_model = onnx.load(str(onnx_path))
+        onnx.helper.set_model_props(onnx_model, {str(k): str(v) for k, v in metadata.items()})
+        onnx.save(onnx_model, str(onnx_path))
+    logger.info("exported onnx inference graph to %s", onnx_path)
+
+
+class OnnxInfer:
+    """onnxruntime session with the call signature and outputs of SynthesizerTrn.infer
+    (attention and latents are not exported and come back as None). The noise is
+    drawn inside the graph, so a generator cannot make the output reproducible.
+    Graphs exported before max_frames was an input run at full length and are
+    only sliced to max_len afterwards; bounded tells them apart."""
+
+    def __init__(self, onnx_path, intra_op_threads=0, inter_op_threads=1):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        self.session = onnxruntime.InferenceSession(
+            str(onnx_path), sess_options=options, providers=["CPUExecutionProvider"])
+        self.metadata = dict(self.session.get_modelmeta().custom_metadata_map)
+        self.bounded = "max_frames" in {i.name for i in self.session.get_inputs()}
+
+    def __call__(self, x, x_lengths, sid=None, noise_scale=1, length_scale=1, noise_scale_w=1., max_len=None,
+                 generator=None):
+        if sid is None:
+            sid = torch.zeros(x.size(0), dtype=torch.long)
+        inputs = {
+            "x": x.cpu().numpy(),
+            "x_lengths": x_lengths.cpu().numpy(),
+            "sid": sid.cpu().numpy(),
+            "scales": torch.FloatTensor([noise_scale, length_scale, noise_scale_w]).numpy(),
+        }
+        if self.bounded:
+            inputs["max_frames"] = torch.tensor(float("inf") if max_len is None else float(max_len)).numpy()
+        audio, y_mask = self.session.run(None, inputs)
+        o = torch.from_numpy(audio)
+        if max_len is not None and not self.bounded:
+            o = o[:, :, :max_len * (o.size(2) // y_mask.shape[2])]
+        return o, None, torch.from_numpy(y_mask), None
+
+
+def check_onnx_parity(model, onnx_infer, lengths=(16, 64, 128), seed=0):
+    """Max absolute waveform difference between torch and onnxruntime with the
+    sampling noise switched off, over a few text lengths."""
+    generator = torch.Generator().manual_seed(seed)
+    max_diff = 0.0
+    for length in lengths:
+        x = torch.randint(1, model.n_vocab, (1, length), generator=generator)
+        x_lengths = torch.LongTensor([length])
+        sid = torch.zeros(1, dtype=torch.long)
+        with torch.no_grad():
+            expected = model.infer(x, x_lengths, sid=sid, noise_scale=0., noise_scale_w=0.)[0]
+        actual = onnx_infer(x, x_lengths, sid=sid, noise_scale=0., noise_scale_w=0.)[0]
+        if actual.shape != expected.shape:
+            return float("inf")
+        max_diff = max(max_diff, (actual - expected).abs().max().item())
+    return max_diff
+
+
+class _PointwiseLinear(nn.Module):
+    """A 1x1 Conv1d as nn.Linear, so quantize_dynamic can pick it up."""
+
+    def __init__(self, conv):
+        super().__init__()
+        self.linear = nn.Linear(conv.in_channels, conv.out_channels, bias=conv.bias is not None)
+        with torch.no_grad():
+            self.linear.weight.copy_(conv.weight[:, :, 0])
+            if conv.bias is not None:
+                self.linear.bias.copy_(conv.bias)
+
+    def forward(self, x):
+        return self.linear(x.transpose(1, 2)).transpose(1, 2)
+
+
+class _QuantizedConv(nn.Module):
+    """Runs one conv in int8 with fp32 in and out, so the surrounding
+    activations and residual adds stay in float."""
+
+    def __init__(self, conv, qconfig):
+        super().__init__()
+        self.quant = quantization.QuantStub()
+        self.conv = conv
+        self.dequant = quantization.DeQuantStub()
+        self.qconfig = qconfig
+
+    # the geometry Generator.receptive_field() and stream() read from its convs
+    @property
+    def kernel_size(self):
+        return self.conv.kernel_size
+
+    @property
+    def stride(self):
+        return self.conv.stride
+
+    @property
+    def padding(self):
+        return self.conv.padding
+
+    @property
+    def dilation(self):
+        return self.conv.dilation
+
+    def forward(self, x):
+        return self.dequant(self.conv(self.quant(x)))
+
+
+# MinMax observers: histogram observers need too much memory on waveform-rate activations
+_ACTIVATION_OBSERVER = quantization.MinMaxObserver.with_args(dtype=torch.quint8, reduce_range=True)
+_CONV_QCONFIG = quantization.QConfig(
+    activation=_ACTIVATION_OBSERVER, weight=quantization.default_per_channel_weight_observer)
+# quantized ConvTranspose1d only takes per-tensor weights
+_CONV_TRANSPOSE_QCONFIG = quantization.QConfig(
+    activation=_ACTIVATION_OBSERVER, weight=quantization.default_weight_observer)
+
+
+def _swap_pointwise_convs(module):
+    for name, child in module.named_children():
+        if type(child) is nn.Conv1d and child.kernel_size == (1,) and child.groups == 1:
+            setattr(module, name, _PointwiseLinear(child))
+        else:
+            _swap_pointwise_convs(child)
+
+
+def quantize_int8(model, calibration_inputs=(), quantize_resblocks=False):
+    """Quantize a CPU SynthesizerTrn prepared with prepare_for_inference(), in place.
+
+    The attention projections and other 1x1 convs of the text encoder, duration
+    predictor and flows get dynamic int8. The Generator upsampling convs get
+    static int8, calibrated by running infer on calibration_inputs, a list of
+    (x, x_lengths, sid). The resblock convs are left in fp32 unless
+    quantize_resblocks is set: fbgemm's dilated int8 conv1d tends to be slower
+    than fp32. Run benchmarks/bench_quantize.py to check on the target host.
+    """
+    for part in (model.enc_p, model.dp, model.flow):
+        _swap_pointwise_convs(part)
+    quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8, inplace=True)
+
+    if calibration_inputs:
+        dec = model.dec
+        for i, up in enumerate(dec.ups):
+            dec.ups[i] = _QuantizedConv(up, _CONV_TRANSPOSE_QCONFIG)
+        if quantize_resblocks:
+            for block in dec.resblocks:
+                for convs in [getattr(block, name) for name in ('convs1', 'convs2', 'convs') if hasattr(block, name)]:
+                    for i, conv in enumerate(convs):
+                        convs[i] = _QuantizedConv(conv, _CONV_QCONFIG)
+        quantization.prepare(dec, inplace=True)
+        with torch.no_grad():
+            for x, x_lengths, sid in calibration_inputs:
+                model.infer(x, x_lengths, sid=sid)
+        quantization.convert(dec, inplace=True)
+    model.clear_speaker_cache()
+    return model
+
+
+def _mel_filterbank(sampling_rate, n_fft, n_mels, fmin=0.0, fmax=None):
+    fmax = fmax or sampling_rate / 2
+    mels = torch.linspace(2595 * math.log10(1 + fmin / 700), 2595 * math.log10(1 + fmax / 700), n_mels + 2)
+    hz = 700 * (10 ** (mels / 2595) - 1)
+    freqs = torch.linspace(0, sampling_rate / 2, n_fft // 2 + 1)
+    lower = (freqs[None, :] - hz[:-2, None]) / (hz[1:-1, None] - hz[:-2, None])
+    upper = (hz[2:, None] - freqs[None, :]) / (hz[2:, None] - hz[1:-1, None])
+    return torch.clamp(torch.min(lower, upper), min=0)
+
+
+def mel_distance(reference, audio, sampling_rate, n_fft=1024, hop_length=256, n_mels=80):
+    """Mean L1 distance between the log-mel spectrograms of two waveforms
+    (any leading shape, time last), over their common length."""
+    n = min(reference.size(-1), audio.size(-1))
+    window = torch.hann_window(n_fft)
+    mel_basis = _mel_filterbank(sampling_rate, n_fft, n_mels)
+
+    def log_mel(y):
+        y = y.reshape(-1, y.size(-1))[:, :n].float()
+        spec = torch.stft(y, n_fft, hop_length, window=window, return_complex=True).abs()
+        return torch.log(torch.clamp(torch.matmul(mel_basis, spec), min=1e-5))
+
+    return (log_mel(reference) - log_mel(audio)).abs().mean().item()
@@ -0,0 +1,154 @@
+import threading
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional
+
+import torch
+from nonebot import logger
+
+from . import commons
+from . import utils
+from .text import text_to_sequence
+
+# 一份权重的标识：路径都相同的音色共用同一个已加载模型
+ModelSpec = namedtuple("ModelSpec", ["model_path", "config_path", "inference_model_path", "onnx_path"])
+# 音色 = 模型 + 说话人（名称或编号）
+VoiceSpec = namedtuple("VoiceSpec", ["name", "model", "speaker"])
+# 可合成的最短符号序列（加空白符之前）
+MIN_SYMBOLS = 3
+
+
+class TextFrontend:
+    """文本清洗与符号映射，按结果缓存；符号表与清洗器相同的模型共用一个实例"""
+
+    def __init__(self, symbols: List[str], cleaner_names: List[str], add_blank: bool, cache_size: int = 1024):
+        self.symbols = list(symbols)
+        self.cleaner_names = list(cleaner_names)
+        self.add_blank = add_blank
+        self._encode = lru_cache(maxsize=cache_size)(self._encode_uncached)
+
+    def _encode_uncached(self, text: str) -> tuple:
+        text_norm = text_to_sequence(text, self.symbols, self.cleaner_names)
+        # 长度校验
+        if len(text_norm) < MIN_SYMBOLS:
+            raise ValueError(f"符号序列过短（{len(text_norm)}）")
+        if self.add_blank:
+            text_norm = commons.intersperse(text_norm, 0)
+        return tuple(text_norm)
+
+    def encode(self, text: str) -> torch.LongTensor:
+        return torch.LongTensor(self._encode(text))
+
+
+class LoadedModel:
+    """已加载的模型：推理入口、超参数与共享的文本前端"""
+
+    def __init__(self, hps, infer: Callable, frontend: TextFrontend, net_g=None, device: str = "cpu", nbytes: int = 0):
+        self.hps = hps
+        self.infer = infer
+        self.frontend = frontend
+        self.net_g = net_g  # onnxruntime后端为None
+        self.device = device
+        self.nbytes = nbytes
+        self._speaker_ids: Dict[Any, int] = {}
+
+    def speaker_id(self, speaker: Any) -> int:
+        """说话人名称按配置中的speakers表换成编号，数字直接使用；每个名称只解析一次"""
+        if isinstance(speaker, int):
+            return speaker
+        if speaker not in self._speaker_ids:
+            self._speaker_ids[speaker] = self._resolve_speaker(speaker)
+        return self._speaker_ids[speaker]
+
+    def _resolve_speaker(self, speaker: Any) -> int:
+        speakers = self.hps["speakers"] if "speakers" in self.hps else {}
+        if isinstance(speakers, list):
+            speakers = {name: i for i, name in enumerate(speakers)}
+        if speaker in speakers:
+            return int(speakers[speaker])
+        if str(speaker).isdigit():
+            return int(speaker)
+        # 单说话人模型不看说话人编号，无需提示
+        if self.hps.data.n_speakers > 1:
+            logger.warning(f"模型中没有说话人 {speaker}，使用0号说话人")
+        return 0
+
+
+def model_nbytes(model: torch.nn.Module) -> int:
+    """模型权重占用的字节数（按state_dict中的张量估算）"""
+    return sum(v.numel() * v.element_size() for v in model.state_dict().values() if isinstance(v, torch.Tensor))
+
+
+class ModelRegistry:
+    """按需加载模型，超出内存预算时按最近最少使用淘汰"""
+
+    def __init__(self, loader: Callable[[ModelSpec], LoadedModel], memory_budget: int = 0):
+        self._loader = loader
+        self.memory_budget = memory_budget  # 字节，0为不限制
+        self._models: "OrderedDict[ModelSpec, LoadedModel]" = OrderedDict()
+        self._frontends: Dict[tuple, TextFrontend] = {}
+        self._hparams: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+        self._load_locks: Dict[ModelSpec, threading.Lock] = {}
+
+    def get(self, spec: ModelSpec) -> LoadedModel:
+        """取出已加载的模型，未加载时在调用线程中加载；同一模型不会被并发重复加载"""
+        with self._lock:
+            model = self._lookup(spec)
+            if model is not None:
+                return model
+            load_lock = self._load_locks.setdefault(spec, threading.Lock())
+        with load_lock:
+            with self._lock:
+                model = self._lookup(spec)
+                if model is not None:
+                    return model
+            # 加载期间不持有全局锁，其他已加载模型照常服务
+            model = self._loader(spec)
+            with self._lock:
+                self._models[spec] = model
+                self._evict()
+                self._load_locks.pop(spec, None)
+            logger.info(f"已加载模型 {spec.model_path}（{model.nbytes / 2**20:.0f}MB），"
+                        f"当前占用 {self.memory_used / 2**20:.0f}MB")
+            return model
+
+    def _lookup(self, spec: ModelSpec) -> Optional[LoadedModel]:
+        model = self._models.get(spec)
+        if model is not None:
+            self._models.move_to_end(spec)
+        return model
+
+    def _evict(self):
+        # 最新加载的模型排在末尾，始终保留
+        evicted = False
+        while self.memory_budget > 0 and self.memory_used > self.memory_budget and len(self._models) > 1:
+            spec, _ = self._models.popitem(last=False)
+            logger.info(f"内存预算不足，卸载模型 {spec.model_path}")
+            evicted = True
+        if evicted and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    @property
+    def memory_used(self) -> int:
+        with self._lock:
+            return sum(model.nbytes for model in self._models.values())
+
+    def loaded(self) -> List[ModelSpec]:
+        with self._lock:
+            return list(self._models)
+
+    def hparams(self, config_path: str):
+        """读取并缓存模型配置（只读json，不加载权重）"""
+        with self._lock:
+            if config_path not in self._hparams:
+                self._hparams[config_path] = utils.get_hparams_from_file(str(config_path))
+            return self._hparams[config_path]
+
+    def frontend(self, hps) -> TextFrontend:
+        """符号表、清洗器与add_blank相同的模型共用同一文本前端及其缓存"""
+        key = (tuple(hps.symbols), tuple(hps.data.text_cleaners), bool(hps.data.add_blank))
+        with self._lock:
+            if key not in self._frontends:
+                self._frontends[key] = TextFrontend(*key)
+            return self._frontends[key]
@@ -8,9 +8,27 @@ from . import commons
 from . import modules
 from . import attentions
 from . import monotonic_align
+from .profiling import profile_stage
 
 from torch.nn import Conv1d, ConvTranspose1d, AvgPool1d, Conv2d
 from torch.nn.utils import weight_norm, remove_weight_norm, spectral_norm
+from collections import namedtuple
+
+
+# Speaker embedding g [b, h, 1] and its projection by every cond layer infer uses:
+# the duration predictor, each flow (None for Flip) and the decoder.
+SpeakerConditioning = namedtuple('SpeakerConditioning', ['g', 'dp', 'flows', 'dec'])
+
+
+def _autocast_dtype(device_type):
+  """dtype autocast computes in on device_type, None when it is off."""
+  if hasattr(torch, 'get_autocast_dtype'):
+    enabled = torch.is_autocast_enabled(device_type)
+    return torch.get_autocast_dtype(device_type) if enabled else None
+  # torch < 2.4: separate cpu and cuda functions
+  if device_type == 'cpu':
+    return torch.get_autocast_cpu_dtype() if torch.is_autocast_cpu_enabled() else None
+  return torch.get_autocast_gpu_dtype() if torch.is_autocast_enabled() else None
 
 
 class StochasticDurationPredictor(nn.Module):
@@ -46,10 +64,14 @@ class StochasticDurationPredictor(nn.Module):
     if gin_channels != 0:
       self.cond = nn.Conv1d(gin_channels, filter_channels, 1)
 
-  def forward(self, x, x_mask, w=None, g=None, reverse=False, noise_scale=1.0):
+  def forward(self, x, x_mask, w=None, g=None, reverse=False, noise_scale=1.0, g_cond=None, generator=None):
+    """generator: CPU torch.Generator for the noise, or one per batch item (see commons.randn);
+    a seeded one makes the output reproducible."""
     x = torch.detach(x)
     x = self.pre(x)
-    if g is not None:
+    if g_cond is not None:
+      x = x + g_cond
+    elif g is not None:
       g = torch.detach(g)
       x = x + self.cond(g)
     x = self.convs(x, x_mask)
@@ -63,7 +85,7 @@ class StochasticDurationPredictor(nn.Module):
       h_w = self.post_pre(w)
       h_w = self.post_convs(h_w, x_mask)
       h_w = self.post_proj(h_w) * x_mask
-      e_q = torch.randn(w.size(0), 2, w.size(2)).to(device=x.device, dtype=x.dtype) * x_mask
+      e_q = commons.randn((w.size(0), 2, w.size(2)), generator).to(device=x.device, dtype=x.dtype) * x_mask
       z_q = e_q
       for flow in self.post_flows:
         z_q, logdet_q = flow(z_q, x_mask, g=(x + h_w))
@@ -86,7 +108,7 @@ class StochasticDurationPredictor(nn.Module):
     else:
       flows = list(reversed(self.flows))
       flows = flows[:-2] + [flows[-1]] # remove a useless vflow
-      z = torch.randn(x.size(0), 2, x.size(2)).to(device=x.device, dtype=x.dtype) * noise_scale
+      z = commons.randn((x.size(0), 2, x.size(2)), generator, x_mask).to(device=x.device, dtype=x.dtype) * noise_scale
       for flow in flows:
         z = flow(z, x_mask, g=x, reverse=reverse)
       z0, z1 = torch.split(z, [1, 1], 1)
@@ -114,9 +136,11 @@ class DurationPredictor(nn.Module):
     if gin_channels != 0:
       self.cond = nn.Conv1d(gin_channels, in_channels, 1)
 
-  def forward(self, x, x_mask, g=None):
+  def forward(self, x, x_mask, g=None, g_cond=None):
     x = torch.detach(x)
-    if g is not None:
+    if g_cond is not None:
+      x = x + g_cond
+    elif g is not None:
       g = torch.detach(g)
       x = x + self.cond(g)
     x = self.conv_1(x * x_mask)
@@ -198,13 +222,15 @@ class ResidualCouplingBlock(nn.Module):
       self.flows.append(modules.ResidualCouplingLayer(channels, hidden_channels, kernel_size, dilation_rate, n_layers, gin_channels=gin_channels, mean_only=True))
       self.flows.append(modules.Flip())
 
-  def forward(self, x, x_mask, g=None, reverse=False):
+  def forward(self, x, x_mask, g=None, reverse=False, g_conds=None):
+    if g_conds is None:
+      g_conds = [None] * len(self.flows)
     if not reverse:
-      for flow in self.flows:
-        x, _ = flow(x, x_mask, g=g, reverse=reverse)
+      for flow, g_cond in zip(self.flows, g_conds):
+        x, _ = flow(x, x_mask, g=g, reverse=reverse, g_cond=g_cond)
     else:
-      for flow in reversed(self.flows):
-        x = flow(x, x_mask, g=g, reverse=reverse)
+      for flow, g_cond in zip(reversed(self.flows), reversed(g_conds)):
+        x = flow(x, x_mask, g=g, reverse=reverse, g_cond=g_cond)
     return x
 
 
@@ -266,9 +292,11 @@ class Generator(torch.nn.Module):
         if gin_channels != 0:
             self.cond = nn.Conv1d(gin_channels, upsample_initial_channel, 1)
 
-    def forward(self, x, g=None):
+    def forward(self, x, g=None, g_cond=None):
         x = self.conv_pre(x)
-        if g is not None:
+        if g_cond is not None:
+          x = x + g_cond
+        elif g is not None:
           x = x + self.cond(g)
 
         for i in range(self.num_upsamples):
@@ -287,6 +315,42 @@ class Generator(torch.nn.Module):
 
         return x
 
+    def receptive_field(self):
+        """One-sided context of the decoder, in latent frames."""
+        field = (self.conv_pre.kernel_size[0] - 1) / 2
+        scale = 1
+        for i, up in enumerate(self.ups):
+            field += math.ceil(up.kernel_size[0] / up.stride[0]) / 2 / scale
+            scale *= up.stride[0]
+            field += max(
+                sum((c.kernel_size[0] - 1) * c.dilation[0] // 2 for c in self._resblock_convs(block))
+                for block in self.resblocks[i*self.num_kernels:(i+1)*self.num_kernels]) / scale
+        field += (self.conv_post.kernel_size[0] - 1) / 2 / scale
+        return math.ceil(field)
+
+    @staticmethod
+    def _resblock_convs(block):
+        # the conv lists rather than block.modules(): quantize_int8 may have wrapped their entries
+        for name in ('convs1', 'convs2', 'convs'):
+            yield from getattr(block, name, ())
+
+    def stream(self, x, g=None, chunk_size=64, pad=None, g_cond=None):
+        """Decode x [b, c, t] in overlapping windows of chunk_size frames,
+        yielding audio blocks [b, 1, chunk_size * hop] as they are produced.
+        With pad >= receptive_field() the blocks match forward() up to float error."""
+        if pad is None:
+            pad = self.receptive_field()
+        hop = 1
+        for up in self.ups:
+            hop *= up.stride[0]
+        t = x.size(2)
+        for start in range(0, t, chunk_size):
+            end = min(start + chunk_size, t)
+            win_start = max(start - pad, 0)
+            win_end = min(end + pad, t)
+            o = self.forward(x[:, :, win_start:win_end], g=g, g_cond=g_cond)
+            yield o[:, :, (start - win_start) * hop:(end - win_start) * hop]
+
     def remove_weight_norm(self):
         print('Removing weight norm...')
         for l in self.ups:
@@ -454,8 +518,21 @@ class SynthesizerTrn(nn.Module):
 
     if n_speakers >= 1:
       self.emb_g = nn.Embedding(n_speakers, gin_channels)
+    self._speaker_cache = {}
+    # reuses its host buffers across training steps; timed as the maximum_path stage when profiled
+    self.maximum_path = monotonic_align.MaximumPath()
+    # profiling.StageProfiler to record per-stage time and memory in infer (and the training alignment); None disables it
+    self.profiler = None
+    # set by prepare_for_inference; forward and voice_conversion need the removed modules
+    self.inference_only = False
+
+  def _check_trainable(self):
+    if self.inference_only:
+      raise RuntimeError("prepare_for_inference() removed the modules training and voice conversion need; "
+                         "load the full checkpoint into a new SynthesizerTrn")
 
   def forward(self, x, x_lengths, y, y_lengths, sid=None):
+    self._check_trainable()
 
     x, m_p, logs_p, x_mask = self.enc_p(x, x_lengths)
     if self.n_speakers > 0:
@@ -476,7 +553,8 @@ class SynthesizerTrn(nn.Module):
       neg_cent = neg_cent1 + neg_cent2 + neg_cent3 + neg_cent4
 
       attn_mask = torch.unsqueeze(x_mask, 2) * torch.unsqueeze(y_mask, -1)
-      attn = monotonic_align.maximum_path(neg_cent, attn_mask.squeeze(1)).unsqueeze(1).detach()
+      with profile_stage(self.profiler, 'maximum_path', neg_cent):
+        attn = self.maximum_path(neg_cent, attn_mask.squeeze(1), inplace=True).unsqueeze(1).detach()
 
     w = attn.sum(2)
     if self.use_sdp:
@@ -495,33 +573,147 @@ class SynthesizerTrn(nn.Module):
     o = self.dec(z_slice, g=g)
     return o, l_length, attn, ids_slice, x_mask, y_mask, (z, z_p, m_p, logs_p, m_q, logs_q)
 
-  def infer(self, x, x_lengths, sid=None, noise_scale=1, length_scale=1, noise_scale_w=1., max_len=None):
-    x, m_p, logs_p, x_mask = self.enc_p(x, x_lengths)
-    if self.n_speakers > 0:
-      g = self.emb_g(sid).unsqueeze(-1) # [b, h, 1]
-    else:
-      g = None
+  def infer(self, x, x_lengths, sid=None, noise_scale=1, length_scale=1, noise_scale_w=1., max_len=None, return_attn=False, generator=None):
+    """
+    attn is the dense [b, 1, t_y, t_x] alignment, only built with return_attn; None otherwise.
+    max_len caps the frames per item: durations past it are dropped before the flow and
+    decoder run, so the cost is bounded along with the output.
+    generator: CPU torch.Generator for the duration and prior noise, or a list with one
+    per batch item. The noise is drawn on the CPU and moved to the model's device, so a
+    seeded generator gives the same audio on every call (for the same batch); with one
+    generator per item, seeded alike, each item matches its infer call alone.
+    With self.profiler set, the stages enc_p, dp, generate_path (durations, alignment
+    and prior expansion), flow and dec are timed into its histograms.
+    """
+    z, attn, y_mask, cond, (z_p, m_p, logs_p) = self._infer_latent(x, x_lengths, sid, noise_scale, length_scale, noise_scale_w, return_attn, generator, max_len)
+    with profile_stage(self.profiler, 'dec', z):
+      o = self.dec((z * y_mask)[:,:,:max_len], g_cond=cond and cond.dec)
+    return o, attn, y_mask, (z, z_p, m_p, logs_p)
 
-    if self.use_sdp:
-      logw = self.dp(x, x_mask, g=g, reverse=True, noise_scale=noise_scale_w)
+  def infer_stream(self, x, x_lengths, sid=None, noise_scale=1, length_scale=1, noise_scale_w=1., max_len=None, chunk_size=64, generator=None):
+    """
+    Same as infer, but yields the waveform in blocks of chunk_size latent frames.
+    The profiler sees the stages before dec; the decoder runs between the caller's reads.
+    """
+    z, attn, y_mask, cond, _ = self._infer_latent(x, x_lengths, sid, noise_scale, length_scale, noise_scale_w, generator=generator, max_len=max_len)
+    yield from self.dec.stream((z * y_mask)[:,:,:max_len], g_cond=cond and cond.dec, chunk_size=chunk_size)
+
+  def speaker_conditioning(self, sid):
+    """
+    SpeakerConditioning for the speaker ids sid [b]. They only depend on the
+    weights, so in eval mode each speaker's is computed once and cached until
+    the weights change; mixed-speaker batches are assembled from the cache.
+    Entries are kept per autocast dtype: one computed under bf16 autocast is
+    not reused by an fp32 call.
+    """
+    if self.n_speakers <= 0:
+      return None
+    if self.training or torch.jit.is_tracing():
+      return self._compute_speaker_conditioning(sid)
+    autocast_dtype = _autocast_dtype(sid.device.type)
+    conds = []
+    for speaker in sid.tolist():
+      key = (speaker, sid.device, autocast_dtype)
+      if key not in self._speaker_cache:
+        with torch.no_grad():
+          self._speaker_cache[key] = self._compute_speaker_conditioning(sid.new_tensor([speaker]))
+      conds.append(self._speaker_cache[key])
+    if all(cond is conds[0] for cond in conds):
+      return conds[0] # [1, ...] broadcasts over the batch
+    return SpeakerConditioning(
+      torch.cat([c.g for c in conds]),
+      torch.cat([c.dp for c in conds]),
+      [None if f is None else torch.cat([c.flows[i] for c in conds]) for i, f in enumerate(conds[0].flows)],
+      torch.cat([c.dec for c in conds]))
+
+  def _compute_speaker_conditioning(self, sid):
+    g = self.emb_g(sid).unsqueeze(-1) # [b, h, 1]
+    flows = [flow.enc.cond_layer(g) if isinstance(flow, modules.ResidualCouplingLayer) else None for flow in self.flow.flows]
+    return SpeakerConditioning(g, self.dp.cond(g), flows, self.dec.cond(g))
+
+  def clear_speaker_cache(self):
+    self._speaker_cache = {}
+
+  def _apply(self, *args, **kwargs):
+    self.clear_speaker_cache()
+    return super()._apply(*args, **kwargs)
+
+  def train(self, mode=True):
+    self.clear_speaker_cache()
+    return super().train(mode)
+
+  def load_state_dict(self, *args, **kwargs):
+    self.clear_speaker_cache()
+    return super().load_state_dict(*args, **kwargs)
+
+  def _infer_latent(self, x, x_lengths, sid, noise_scale, length_scale, noise_scale_w, return_attn=False, generator=None, max_len=None):
+    profiler = self.profiler
+    with profile_stage(profiler, 'enc_p', x):
+      x, m_p, logs_p, x_mask = self.enc_p(x, x_lengths)
+    cond = self.speaker_conditioning(sid)
+
+    with profile_stage(profiler, 'dp', x):
+      if self.use_sdp:
+        logw = self.dp(x, x_mask, reverse=True, noise_scale=noise_scale_w, g_cond=cond and cond.dp, generator=generator)
+      else:
+        logw = self.dp(x, x_mask, g_cond=cond and cond.dp)
+    with profile_stage(profiler, 'generate_path', x):
+      # durations are rounded up below, so exp stays in fp32 under autocast
+      with torch.autocast(device_type=logw.device.type, enabled=False):
+        w = torch.exp(logw.float()) * x_mask * length_scale
+      w_ceil = torch.ceil(w)
+      if max_len is not None:
+        # truncate the durations where their running total passes max_len
+        cum_w = torch.clamp(torch.cumsum(w_ceil, -1), max=max_len)
+        w_ceil = cum_w - F.pad(cum_w, [1, 0])[..., :-1] # torch.diff has no onnx export
+      y_lengths = torch.clamp_min(torch.sum(w_ceil, [1, 2]), 1).long()
+      y_mask = torch.unsqueeze(commons.sequence_mask(y_lengths, None), 1).to(x_mask.dtype)
+      if return_attn:
+        attn_mask = torch.unsqueeze(x_mask, 2) * torch.unsqueeze(y_mask, -1)
+        attn = commons.generate_path(w_ceil, attn_mask)
+        m_p = torch.matmul(attn.squeeze(1), m_p.transpose(1, 2)).transpose(1, 2) # [b, t', t], [b, t, d] -> [b, d, t']
+        logs_p = torch.matmul(attn.squeeze(1), logs_p.transpose(1, 2)).transpose(1, 2) # [b, t', t], [b, t, d] -> [b, d, t']
+      else:
+        attn = None
+        m_p, logs_p = torch.split(
+          commons.expand_by_duration(torch.cat([m_p, logs_p], 1), w_ceil, y_mask.size(2)), m_p.size(1), 1)
+
+    if generator is None:
+      # m_p keeps the matmul path's [b, t', d] memory layout, so both paths draw the same noise
+      noise = torch.randn_like(m_p)
     else:
-      logw = self.dp(x, x_mask, g=g)
-    w = torch.exp(logw) * x_mask * length_scale
-    w_ceil = torch.ceil(w)
-    y_lengths = torch.clamp_min(torch.sum(w_ceil, [1, 2]), 1).long()
-    y_mask = torch.unsqueeze(commons.sequence_mask(y_lengths, None), 1).to(x_mask.dtype)
-    attn_mask = torch.unsqueeze(x_mask, 2) * torch.unsqueeze(y_mask, -1)
-    attn = commons.generate_path(w_ceil, attn_mask)
-
-    m_p = torch.matmul(attn.squeeze(1), m_p.transpose(1, 2)).transpose(1, 2) # [b, t', t], [b, t, d] -> [b, d, t']
-    logs_p = torch.matmul(attn.squeeze(1), logs_p.transpose(1, 2)).transpose(1, 2) # [b, t', t], [b, t, d] -> [b, d, t']
-
-    z_p = m_p + torch.randn_like(m_p) * torch.exp(logs_p) * noise_scale
-    z = self.flow(z_p, y_mask, g=g, reverse=True)
-    o = self.dec((z * y_mask)[:,:,:max_len], g=g)
-    return o, attn, y_mask, (z, z_p, m_p, logs_p)
+      noise = commons.randn(m_p.shape, generator, y_mask).to(device=m_p.device, dtype=m_p.dtype)
+    z_p = m_p + noise * torch.exp(logs_p) * noise_scale
+    with profile_stage(profiler, 'flow', z_p):
+      z = self.flow(z_p, y_mask, reverse=True, g_conds=cond and cond.flows)
+    return z, attn, y_mask, cond, (z_p, m_p, logs_p)
+
+  def remove_weight_norm(self):
+    self.clear_speaker_cache()
+    self.dec.remove_weight_norm()
+    for flow in self.flow.flows:
+      if isinstance(flow, modules.ResidualCouplingLayer):
+        flow.enc.remove_weight_norm()
+    if getattr(self, 'enc_q', None) is not None:
+      self.enc_q.enc.remove_weight_norm()
+
+  def prepare_for_inference(self):
+    """
+    Strip the submodules infer never uses and fold weight norm into plain weights.
+    Training and voice conversion are unavailable afterwards.
+    """
+    del self.enc_q
+    self.enc_q = None
+    if self.use_sdp:
+      # the posterior flows only score durations during training
+      for name in ['post_pre', 'post_proj', 'post_convs', 'post_flows']:
+        delattr(self.dp, name)
+    self.remove_weight_norm()
+    self.inference_only = True
+    return self.eval()
 
   def voice_conversion(self, y, y_lengths, sid_src, sid_tgt):
+    self._check_trainable()
     assert self.n_speakers > 0, "n_speakers have to be larger than 0."
     g_src = self.emb_g(sid_src).unsqueeze(-1)
     g_tgt = self.emb_g(sid_tgt).unsqueeze(-1)
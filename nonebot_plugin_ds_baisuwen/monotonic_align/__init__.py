@@ -1,6 +1,24 @@
+import logging
+
 import numpy as np
 import torch
-from .core import maximum_path_c
+
+logger = logging.getLogger(__name__)
+
+# Fastest available implementation of the DP: the compiled Cython extension
+# (python setup.py build_ext --inplace in this directory), then numba, then numpy.
+try:
+  from .core import maximum_path_c
+  BACKEND = 'cython'
+except ImportError:
+  try:
+    from .numba_core import maximum_path_c
+    BACKEND = 'numba'
+  except ImportError:
+    from .numpy_core import maximum_path_c
+    BACKEND = 'numpy'
+    logger.warning("monotonic_align: neither the compiled extension nor numba is available, "
+                   "using the slower numpy implementation")
 
 
 def maximum_path(neg_cent, mask):
@@ -17,3 +35,58 @@ def maximum_path(neg_cent, mask):
   t_s_max = mask.sum(2)[:, 0].data.cpu().numpy().astype(np.int32)
   maximum_path_c(path, neg_cent, t_t_max, t_s_max)
   return torch.from_numpy(path).to(device=device, dtype=dtype)
+
+
+class MaximumPath:
+  """
+  maximum_path for the training loop, without per-step host allocations.
+
+  Host buffers are kept between calls and grow to the largest batch seen;
+  they are pinned when the inputs live on a GPU, for faster transfers. With
+  inplace=True a contiguous float32 CPU neg_cent is used directly as the DP
+  buffer (through its numpy view, no copy) and is overwritten. Not thread-safe:
+  use one instance per model.
+
+  Inputs smaller than min_numel go to plain maximum_path: there the buffer
+  bookkeeping costs more than the allocations it saves (about 32k elements
+  with the Cython backend on CPU, see benchmarks/bench_monotonic_align.py).
+  """
+
+  min_numel = 1 << 15
+
+  def __init__(self):
+    self._values = None
+    self._paths = None
+
+  @staticmethod
+  def _view(buffer, shape, dtype, pin):
+    numel = shape[0] * shape[1] * shape[2]
+    if buffer is None or buffer.numel() < numel or buffer.is_pinned() != pin:
+      buffer = torch.empty(numel, dtype=dtype, pin_memory=pin)
+    return buffer, buffer[:numel].view(shape)
+
+  def __call__(self, neg_cent, mask, inplace=False):
+    """
+    neg_cent: [b, t_t, t_s]
+    mask: [b, t_t, t_s]
+    """
+    if neg_cent.numel() < self.min_numel:
+      return maximum_path(neg_cent, mask)
+    device = neg_cent.device
+    dtype = neg_cent.dtype
+    shape = tuple(neg_cent.shape)
+    pin = device.type == 'cuda'
+    if inplace and device.type == 'cpu' and dtype == torch.float32 and neg_cent.is_contiguous():
+      values = neg_cent.detach()
+    else:
+      self._values, values = self._view(self._values, shape, torch.float32, pin)
+      values.copy_(neg_cent.detach())
+    self._paths, paths = self._view(self._paths, shape, torch.int32, pin)
+    paths.zero_()
+
+    # the mask is an outer product of the two sequence masks: one row and one column give the lengths
+    t_t_max = mask[:, :, 0].sum(1).to(device='cpu', dtype=torch.int32)
+    t_s_max = mask[:, 0, :].sum(1).to(device='cpu', dtype=torch.int32)
+    maximum_path_c(paths.numpy(), values.numpy(), t_t_max.numpy(), t_s_max.numpy())
+    # always a copy, so the buffer can be reused on the next call
+    return paths.to(device=device, dtype=dtype)
@@ -0,0 +1,33 @@
+import numpy as np
+
+
+def maximum_path_c(paths, values, t_ys, t_xs, max_neg_val=-1e9):
+  """
+  Same DP and backtracking as core.pyx, vectorized over the batch and the
+  text axis: each row y only depends on row y-1, so the loops run over the
+  t_y frames instead of every cell.
+  """
+  b, t_y_max, t_x_max = values.shape
+  rows = np.arange(b)
+  x = np.arange(t_x_max)
+  max_neg = np.float32(max_neg_val)
+  for y in range(t_y_max):
+    if y == 0:
+      v_prev = np.where(x == 0, np.float32(0.), max_neg)[None, :]
+      v_cur = max_neg
+    else:
+      prev = values[:, y-1]
+      v_prev = np.concatenate([np.full((b, 1), max_neg, dtype=values.dtype), prev[:, :-1]], 1)
+      v_cur = np.where(x == y, max_neg, prev)
+    valid = (x >= np.maximum(0, t_xs + y - t_ys)[:, None]) & (x < np.minimum(t_xs, y + 1)[:, None]) & (y < t_ys)[:, None]
+    values[:, y] += np.where(valid, np.maximum(v_prev, v_cur), np.float32(0.))
+
+  index = t_xs.astype(np.int64) - 1
+  for y in range(t_y_max - 1, -1, -1):
+    active = y < t_ys
+    paths[rows[active], y, index[active]] = 1
+    if y == 0:
+      break
+    prev = values[:, y-1]
+    step = (index == y) | (prev[rows, index] < prev[rows, np.maximum(index - 1, 0)])
+    index = index - (active & (index != 0) & step)
@@ -1,13 +1,30 @@
+import sys
+
 from setuptools import setup, Extension
 
+# 在本目录执行: python setup.py build_ext --inplace
+# 安装了Cython时直接编译core.pyx，否则使用随仓库提供的core.c
+try:
+    from Cython.Build import cythonize
+except ImportError:
+    cythonize = None
+
+# OpenMP让core.pyx中的prange按batch并行；macOS自带clang不含OpenMP，按串行编译
+if sys.platform == 'win32':
+    compile_args, link_args = ['/O2', '/openmp'], []
+elif sys.platform == 'darwin':
+    compile_args, link_args = ['-O3'], []
+else:
+    compile_args, link_args = ['-O3', '-fopenmp'], ['-fopenmp']
+
 module = Extension(
     'core',
-    sources=['core.c'],
+    sources=['core.pyx' if cythonize else 'core.c'],
+    extra_compile_args=compile_args,
+    extra_link_args=link_args,
 )
 
 setup(
     name='monotonic_align',
-    ext_modules=[module],
-    # 如果使用包结构，可能需要指定package_dir
-    package_dir={'nonebot_plugin_baisuwen.monotonic_align': '.'},
-)
\ No newline at end of file
+    ext_modules=cythonize([module], language_level=3, build_dir='build') if cythonize else [module],
+)
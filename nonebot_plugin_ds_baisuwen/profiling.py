@@ -0,0 +1,164 @@
+import bisect
+import contextlib
+import threading
+import time
+
+import torch
+
+# upper bounds of the histogram buckets; a final +inf bucket catches the rest
+TIME_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+MEMORY_BUCKETS_MB = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+_DISABLED = contextlib.nullcontext()
+
+
+class Histogram:
+    """Fixed-bucket histogram (Prometheus style: per-bucket counts plus sum and count).
+    Quantiles are interpolated within their bucket. Thread-safe."""
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self._lock = threading.Lock()
+        self._zero()
+
+    def _zero(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.
+        self.max = 0.
+
+    def reset(self):
+        with self._lock:
+            self._zero()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.sum += value
+            self.max = max(self.max, value)
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.bounds[i - 1] if i else 0.
+                upper = self.bounds[i] if i < len(self.bounds) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+    def snapshot(self, reset=False):
+        with self._lock:
+            state = {"counts": list(self.counts), "count": self.count, "sum": self.sum, "max": self.max}
+            if reset:
+                self._zero()
+        return state
+
+    def merge(self, state):
+        """Add a snapshot() taken elsewhere (e.g. in a worker process)."""
+        with self._lock:
+            self.counts = [a + b for a, b in zip(self.counts, state["counts"])]
+            self.count += state["count"]
+            self.sum += state["sum"]
+            self.max = max(self.max, state["max"])
+
+    def summary(self):
+        with self._lock:
+            return {
+                "count": self.count,
+                "mean": self.sum / self.count if self.count else 0.,
+                "p50": self.quantile(0.5),
+                "p95": self.quantile(0.95),
+                "p99": self.quantile(0.99),
+                "max": self.max,
+            }
+
+
+class StageProfiler:
+    """
+    Wall time and peak memory of the inference stages, aggregated into histograms.
+
+    Attach it as SynthesizerTrn.profiler; infer then times each stage in
+    stage(name), and the training forward its monotonic alignment as
+    maximum_path. On CUDA the device is synchronized around every stage, so the
+    times are the stage's own, and the peak is the allocator's high-water mark
+    above what was allocated when the stage started (concurrent inference on
+    the same device shares that mark). CPU allocations are not tracked, so
+    on the CPU only time is recorded.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.time_ms = {}
+        self.peak_mb = {}
+
+    def _histogram(self, kind, name):
+        table = getattr(self, kind)
+        histogram = table.get(name)
+        if histogram is None:
+            bounds = TIME_BUCKETS_MS if kind == "time_ms" else MEMORY_BUCKETS_MB
+            with self._lock:
+                histogram = table.setdefault(name, Histogram(bounds))
+        return histogram
+
+    @contextlib.contextmanager
+    def stage(self, name, device):
+        cuda = device.type == 'cuda'
+        if cuda:
+            torch.cuda.synchronize(device)
+            torch.cuda.reset_peak_memory_stats(device)
+            allocated = torch.cuda.memory_allocated(device)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if cuda:
+                torch.cuda.synchronize(device)
+            self._histogram("time_ms", name).observe((time.perf_counter() - start) * 1000)
+            if cuda:
+                self._histogram("peak_mb", name).observe(
+                    (torch.cuda.max_memory_allocated(device) - allocated) / 2**20)
+
+    def snapshot(self, reset=False):
+        """Histogram states per stage, for merge() in another process."""
+        with self._lock:
+            tables = {"time_ms": dict(self.time_ms), "peak_mb": dict(self.peak_mb)}
+        return {kind: {name: h.snapshot(reset) for name, h in table.items()} for kind, table in tables.items()}
+
+    def merge(self, snapshot):
+        for kind in ("time_ms", "peak_mb"):
+            for name, state in snapshot.get(kind, {}).items():
+                if state["count"]:
+                    self._histogram(kind, name).merge(state)
+
+    def reset(self):
+        with self._lock:
+            self.time_ms = {}
+            self.peak_mb = {}
+
+    def summary(self):
+        """{stage: {"time_ms": {count, mean, p50, p95, p99, max}, "peak_mb": {...}}}"""
+        with self._lock:
+            tables = {"time_ms": dict(self.time_ms), "peak_mb": dict(self.peak_mb)}
+        result = {}
+        for kind, table in tables.items():
+            for name, histogram in table.items():
+                result.setdefault(name, {})[kind] = histogram.summary()
+        return result
+
+
+def profile_stage(profiler, name, ref):
+    """profiler.stage(name) on ref's device, or a shared no-op context when
+    profiling is off or the model is being traced / compiled."""
+    if profiler is None or torch.jit.is_tracing() or _is_compiling():
+        return _DISABLED
+    return profiler.stage(name, ref.device)
+
+
+def _is_compiling():
+    compiler = getattr(torch, "compiler", None)
+    return compiler is not None and hasattr(compiler, "is_compiling") and compiler.is_compiling()
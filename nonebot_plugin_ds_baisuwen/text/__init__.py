@@ -1,6 +1,12 @@
 """ from https://github.com/keithito/tacotron """
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import torch
+
 from . import cleaners
 from .symbols import symbols
+from ..commons import intersperse
 
 
 # Mappings from symbol to numeric ID and vice versa:
@@ -42,6 +48,38 @@ def cleaned_text_to_sequence(cleaned_text, symbols):
   return sequence
 
 
+def text_to_sequence_batch(texts, symbols, cleaner_names, add_blank=False, num_workers=1):
+  '''Converts many strings at once into a padded batch of symbol IDs.
+    Args:
+      texts: list of strings to convert
+      cleaner_names: names of the cleaner functions to run the texts through
+      add_blank: intersperse a blank (ID 0) between symbols, as hps.data.add_blank
+      num_workers: clean in a process pool when larger than 1
+    Returns:
+      (padded LongTensor [b, t_max], lengths LongTensor [b], order LongTensor [b]),
+      sorted by decreasing length so padding is minimal; texts[order[i]] is row i
+  '''
+  if num_workers > 1 and len(texts) > 1:
+    chunk_size = -(-len(texts) // num_workers)
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+      clean_texts = [t for part in pool.map(_clean_text_batch, chunks, [cleaner_names] * len(chunks)) for t in part]
+  else:
+    clean_texts = _clean_text_batch(texts, cleaner_names)
+
+  symbol_to_id = _symbol_to_id_table(tuple(symbols))
+  sequences = [[symbol_to_id[symbol] for symbol in clean_text if symbol in symbol_to_id] for clean_text in clean_texts]
+  if add_blank:
+    sequences = [intersperse(sequence, 0) for sequence in sequences]
+
+  lengths = torch.LongTensor([len(sequence) for sequence in sequences])
+  lengths, order = torch.sort(lengths, descending=True)
+  padded = torch.zeros(len(sequences), int(lengths[0]) if len(sequences) else 0, dtype=torch.long)
+  for row, i in enumerate(order.tolist()):
+    padded[row, :lengths[row]] = torch.LongTensor(sequences[i])
+  return padded, lengths, order
+
+
 def sequence_to_text(sequence):
   '''Converts a sequence of IDs back to a string'''
   result = ''
@@ -51,6 +89,25 @@ def sequence_to_text(sequence):
   return result
 
 
+@lru_cache(maxsize=8)
+def _symbol_to_id_table(symbols):
+  return {s: i for i, s in enumerate(symbols)}
+
+
+def _clean_text_batch(texts, cleaner_names):
+  texts = list(texts)
+  for name in cleaner_names:
+    batch_cleaner = getattr(cleaners, name + '_batch', None)
+    if batch_cleaner is not None:
+      texts = batch_cleaner(texts)
+      continue
+    cleaner = getattr(cleaners, name)
+    if not cleaner:
+      raise Exception('Unknown cleaner: %s' % name)
+    texts = [cleaner(text) for text in texts]
+  return texts
+
+
 def _clean_text(text, cleaner_names):
   for name in cleaner_names:
     cleaner = getattr(cleaners, name)
@@ -6,6 +6,8 @@ from .sanskrit import devanagari_to_ipa
 from .english import english_to_lazy_ipa, english_to_ipa2, english_to_lazy_ipa2
 from .thai import num_to_thai, latin_to_thai
 from pypinyin import Style, pinyin
+from pypinyin.converter import UltimateConverter
+from pypinyin.core import Pinyin
 # from text.shanghainese import shanghainese_to_ipa
 # from text.cantonese import cantonese_to_ipa
 # from text.ngu_dialect import ngu_dialect_to_ipa
@@ -30,68 +32,81 @@ def korean_cleaners(text):
     return text
 
 
-def chinese_cleaners(text):
-    # 保留中文、常用标点和基本拉丁字符
-    text = re.sub(r'[^\u4e00-\u9fff，。！？、a-zA-Z0-9\s]', '', text)
-    
-    # 分割文本为汉字和标点
-    segments = re.split(r'([，。！？、])', text)
-    phones = []
-    
-    for seg in segments:
-        if not seg:
-            continue
-        if seg in ['，', '。', '！', '？', '、']:
-            # 将中文标点映射为对应符号
-            phones.append({
-                '，': ',', 
-                '。': '.', 
-                '！': '!', 
-                '？': '?', 
-                '、': ','
-            }[seg])
-        else:
-            # 处理中文部分
-            seg_phones = pinyin(seg, style=Style.TONE3)
-            phones.extend([p[0] for p in seg_phones])
-    
-    # 添加句子结束标点
-    if phones and phones[-1] not in ['.', '!', '?']:
-        phones.append('.')
-    
-    return ' '.join(phones)
-
-
-def zh_ja_mixture_cleaners(text):
-    # 保留中文、常用标点和基本拉丁字符
-    text = re.sub(r'[^\u4e00-\u9fff，。！？、a-zA-Z0-9\s]', '', text)
-    
-    # 分割文本为汉字和标点
-    segments = re.split(r'([，。！？、])', text)
-    phones = []
-    
-    for seg in segments:
-        if not seg:
-            continue
-        if seg in ['，', '。', '！', '？', '、']:
-            # 将中文标点映射为对应符号
-            phones.append({
-                '，': ',', 
-                '。': '.', 
-                '！': '!', 
-                '？': '?', 
-                '、': ','
-            }[seg])
-        else:
-            # 处理中文部分
-            seg_phones = pinyin(seg, style=Style.TONE3)
-            phones.extend([p[0] for p in seg_phones])
-    
-    # 添加句子结束标点
-    if phones and phones[-1] not in ['.', '!', '?']:
-        phones.append('.')
-    
-    return ' '.join(phones)
+# 中文标点 -> 模型符号表中的标点
+_zh_punctuation_map = {
+    '，': ',',
+    '。': '.',
+    '！': '!',
+    '？': '?',
+    '、': ',',
+}
+# 保留中文、常用标点和基本拉丁字符
+_mixed_script_filter = re.compile(r'[^\u4e00-\u9fff，。！？、a-zA-Z0-9\s]')
+# 一次切分出 汉字串 / 中文标点 / 其余字符串（拉丁字母、数字、空白）
+_mixed_script_tokenizer = re.compile(
+    r'([\u4e00-\u9fff]+)|([，。！？、])|([^\u4e00-\u9fff，。！？、]+)')
+_sentence_end = ('.', '!', '?')
+
+
+def _tokenize_mixed_script(text):
+    text = _mixed_script_filter.sub('', text)
+    return [(m.lastindex, m.group(m.lastindex))
+            for m in _mixed_script_tokenizer.finditer(text)]
+
+
+_pinyin = Pinyin(UltimateConverter())
+
+
+def _batch_pinyin(han_runs):
+    '''All Han runs of all sentences go through a single pypinyin conversion.
+    Runs are word-segmented first so polyphones resolve exactly as they do
+    when each run is converted on its own.'''
+    if not han_runs:
+        return []
+    words = [word for run in han_runs for word in _pinyin.seg(run)]
+    flat = [p[0] for p in _pinyin.pinyin(words, style=Style.TONE3)]
+    if len(flat) != sum(len(run) for run in han_runs):
+        # 有字符未被逐字转换（如生僻字无拼音），退回逐段转换以保证对齐
+        return [[p[0] for p in pinyin(run, style=Style.TONE3)] for run in han_runs]
+    result = []
+    offset = 0
+    for run in han_runs:
+        result.append(flat[offset:offset + len(run)])
+        offset += len(run)
+    return result
+
+
+def mixed_script_cleaners_batch(texts):
+    '''Pipeline for Chinese text mixed with Latin letters and digits,
+    cleaning a list of sentences at once.'''
+    tokenized = [_tokenize_mixed_script(text) for text in texts]
+    han_runs = [token for tokens in tokenized for kind, token in tokens if kind == 1]
+    han_phones = iter(_batch_pinyin(han_runs))
+
+    results = []
+    for tokens in tokenized:
+        phones = []
+        for kind, token in tokens:
+            if kind == 1:
+                phones.extend(next(han_phones))
+            elif kind == 2:
+                phones.append(_zh_punctuation_map[token])
+            else:
+                phones.append(token)
+
+        # 添加句子结束标点
+        if phones and phones[-1] not in _sentence_end:
+            phones.append('.')
+        results.append(' '.join(phones))
+    return results
+
+
+def mixed_script_cleaners(text):
+    return mixed_script_cleaners_batch([text])[0]
+
+
+chinese_cleaners = zh_ja_mixture_cleaners = mixed_script_cleaners
+chinese_cleaners_batch = zh_ja_mixture_cleaners_batch = mixed_script_cleaners_batch
 
 
 def sanskrit_cleaners(text):
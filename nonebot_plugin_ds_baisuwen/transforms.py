@@ -20,6 +20,22 @@ def piecewise_rational_quadratic_transform(inputs,
                                            min_bin_height=DEFAULT_MIN_BIN_HEIGHT,
                                            min_derivative=DEFAULT_MIN_DERIVATIVE):
 
+    # the spline math stays in fp32 even under reduced-precision autocast
+    if any(t.dtype != torch.float32 for t in (inputs, unnormalized_widths,
+                                              unnormalized_heights, unnormalized_derivatives)):
+        with torch.autocast(device_type=inputs.device.type, enabled=False):
+            return piecewise_rational_quadratic_transform(
+                inputs.float(),
+                unnormalized_widths.float(),
+                unnormalized_heights.float(),
+                unnormalized_derivatives.float(),
+                inverse=inverse,
+                tails=tails,
+                tail_bound=tail_bound,
+                min_bin_width=min_bin_width,
+                min_bin_height=min_bin_height,
+                min_derivative=min_derivative)
+
     if tails is None:
         spline_fn = rational_quadratic_spline
         spline_kwargs = {}
@@ -44,12 +60,16 @@ def piecewise_rational_quadratic_transform(inputs,
     return outputs, logabsdet
 
 
-def searchsorted(bin_locations, inputs, eps=1e-6):
-    bin_locations[..., -1] += eps
-    return torch.sum(
-        inputs[..., None] >= bin_locations,
-        dim=-1
-    ) - 1
+def searchsorted(bin_locations, inputs):
+    """Index of the bin of bin_locations (edges, sorted along the last dim) that
+    holds each input; inputs on the last edge fall in the last bin."""
+    num_bins = bin_locations.shape[-1] - 1
+    if torch.jit.is_tracing():
+        # onnx has no searchsorted; count the edges at or below each input instead
+        bin_idx = torch.sum(inputs[..., None] >= bin_locations, dim=-1) - 1
+    else:
+        bin_idx = torch.searchsorted(bin_locations, inputs[..., None], right=True)[..., 0] - 1
+    return bin_idx.clamp(0, num_bins - 1)
 
 
 def unconstrained_rational_quadratic_spline(inputs,
@@ -62,28 +82,22 @@ def unconstrained_rational_quadratic_spline(inputs,
                                             min_bin_width=DEFAULT_MIN_BIN_WIDTH,
                                             min_bin_height=DEFAULT_MIN_BIN_HEIGHT,
                                             min_derivative=DEFAULT_MIN_DERIVATIVE):
-    inside_interval_mask = (inputs >= -tail_bound) & (inputs <= tail_bound)
-    outside_interval_mask = ~inside_interval_mask
-
-    outputs = torch.zeros_like(inputs)
-    logabsdet = torch.zeros_like(inputs)
-
-    if tails == 'linear':
-        unnormalized_derivatives = F.pad(unnormalized_derivatives, pad=(1, 1))
-        constant = np.log(np.exp(1 - min_derivative) - 1)
-        unnormalized_derivatives[..., 0] = constant
-        unnormalized_derivatives[..., -1] = constant
-
-        outputs[outside_interval_mask] = inputs[outside_interval_mask]
-        logabsdet[outside_interval_mask] = 0
-    else:
+    if tails != 'linear':
         raise RuntimeError('{} tails are not implemented.'.format(tails))
 
-    outputs[inside_interval_mask], logabsdet[inside_interval_mask] = rational_quadratic_spline(
-        inputs=inputs[inside_interval_mask],
-        unnormalized_widths=unnormalized_widths[inside_interval_mask, :],
-        unnormalized_heights=unnormalized_heights[inside_interval_mask, :],
-        unnormalized_derivatives=unnormalized_derivatives[inside_interval_mask, :],
+    # linear tails: identity outside [-tail_bound, tail_bound], with the boundary
+    # derivatives pinned to 1 so the spline joins the identity smoothly
+    constant = float(np.log(np.exp(1 - min_derivative) - 1))
+    unnormalized_derivatives = F.pad(unnormalized_derivatives, pad=(1, 1), value=constant)
+
+    # run the spline on every element (outside ones clamped into the interval)
+    # and select, instead of masked gathers and scatters
+    inside_interval_mask = (inputs >= -tail_bound) & (inputs <= tail_bound)
+    spline_outputs, spline_logabsdet = _rational_quadratic_spline(
+        inputs=inputs.clamp(-tail_bound, tail_bound),
+        unnormalized_widths=unnormalized_widths,
+        unnormalized_heights=unnormalized_heights,
+        unnormalized_derivatives=unnormalized_derivatives,
         inverse=inverse,
         left=-tail_bound, right=tail_bound, bottom=-tail_bound, top=tail_bound,
         min_bin_width=min_bin_width,
@@ -91,6 +105,8 @@ def unconstrained_rational_quadratic_spline(inputs,
         min_derivative=min_derivative
     )
 
+    outputs = torch.where(inside_interval_mask, spline_outputs, inputs)
+    logabsdet = torch.where(inside_interval_mask, spline_logabsdet, torch.zeros_like(spline_logabsdet))
     return outputs, logabsdet
 
 def rational_quadratic_spline(inputs,
@@ -105,6 +121,39 @@ def rational_quadratic_spline(inputs,
     if torch.min(inputs) < left or torch.max(inputs) > right:
         raise ValueError('Input to a transform is not within its domain')
 
+    return _rational_quadratic_spline(
+        inputs, unnormalized_widths, unnormalized_heights, unnormalized_derivatives,
+        inverse=inverse, left=left, right=right, bottom=bottom, top=top,
+        min_bin_width=min_bin_width, min_bin_height=min_bin_height, min_derivative=min_derivative)
+
+
+def _softmax(x):
+    # F.softmax over a last dim of ~10 bins is an order of magnitude slower on CPU
+    # than these elementwise ops
+    e = torch.exp(x - x.amax(dim=-1, keepdim=True))
+    return e / e.sum(dim=-1, keepdim=True)
+
+
+def _bin_edges(unnormalized, lower, upper, min_bin_size):
+    num_bins = unnormalized.shape[-1]
+    sizes = _softmax(unnormalized)
+    sizes = min_bin_size + (1 - min_bin_size * num_bins) * sizes
+    cumsizes = torch.cumsum(sizes, dim=-1)
+    # the first and last edges are exactly lower and upper
+    inner = (upper - lower) * cumsizes[..., :-1] + lower
+    edges = F.pad(F.pad(inner, pad=(1, 0), value=lower), pad=(0, 1), value=upper)
+    return edges, edges[..., 1:] - edges[..., :-1]
+
+
+def _rational_quadratic_spline(inputs,
+                               unnormalized_widths,
+                               unnormalized_heights,
+                               unnormalized_derivatives,
+                               inverse,
+                               left, right, bottom, top,
+                               min_bin_width,
+                               min_bin_height,
+                               min_derivative):
     num_bins = unnormalized_widths.shape[-1]
 
     if min_bin_width * num_bins > 1.0:
@@ -112,82 +161,55 @@ def rational_quadratic_spline(inputs,
     if min_bin_height * num_bins > 1.0:
         raise ValueError('Minimal bin height too large for the number of bins')
 
-    widths = F.softmax(unnormalized_widths, dim=-1)
-    widths = min_bin_width + (1 - min_bin_width * num_bins) * widths
-    cumwidths = torch.cumsum(widths, dim=-1)
-    cumwidths = F.pad(cumwidths, pad=(1, 0), mode='constant', value=0.0)
-    cumwidths = (right - left) * cumwidths + left
-    cumwidths[..., 0] = left
-    cumwidths[..., -1] = right
-    widths = cumwidths[..., 1:] - cumwidths[..., :-1]
-
+    cumwidths, widths = _bin_edges(unnormalized_widths, left, right, min_bin_width)
+    cumheights, heights = _bin_edges(unnormalized_heights, bottom, top, min_bin_height)
     derivatives = min_derivative + F.softplus(unnormalized_derivatives)
-
-    heights = F.softmax(unnormalized_heights, dim=-1)
-    heights = min_bin_height + (1 - min_bin_height * num_bins) * heights
-    cumheights = torch.cumsum(heights, dim=-1)
-    cumheights = F.pad(cumheights, pad=(1, 0), mode='constant', value=0.0)
-    cumheights = (top - bottom) * cumheights + bottom
-    cumheights[..., 0] = bottom
-    cumheights[..., -1] = top
-    heights = cumheights[..., 1:] - cumheights[..., :-1]
+    delta = heights / widths
 
     if inverse:
-        bin_idx = searchsorted(cumheights, inputs)[..., None]
+        bin_idx = searchsorted(cumheights, inputs)
     else:
-        bin_idx = searchsorted(cumwidths, inputs)[..., None]
+        bin_idx = searchsorted(cumwidths, inputs)
 
-    input_cumwidths = cumwidths.gather(-1, bin_idx)[..., 0]
-    input_bin_widths = widths.gather(-1, bin_idx)[..., 0]
+    bin_idx = bin_idx[..., None]
 
-    input_cumheights = cumheights.gather(-1, bin_idx)[..., 0]
-    delta = heights / widths
-    input_delta = delta.gather(-1, bin_idx)[..., 0]
+    def at_bin(values):
+        return values.gather(-1, bin_idx)[..., 0]
 
-    input_derivatives = derivatives.gather(-1, bin_idx)[..., 0]
-    input_derivatives_plus_one = derivatives[..., 1:].gather(-1, bin_idx)[..., 0]
+    input_cumwidths = at_bin(cumwidths)
+    input_bin_widths = at_bin(widths)
+    input_cumheights = at_bin(cumheights)
+    input_heights = at_bin(heights)
+    input_delta = at_bin(delta)
+    input_derivatives = at_bin(derivatives)
+    input_derivatives_plus_one = at_bin(derivatives[..., 1:])
 
-    input_heights = heights.gather(-1, bin_idx)[..., 0]
+    slope_sum = input_derivatives + input_derivatives_plus_one - 2 * input_delta
 
     if inverse:
-        a = (((inputs - input_cumheights) * (input_derivatives
-                                             + input_derivatives_plus_one
-                                             - 2 * input_delta)
-              + input_heights * (input_delta - input_derivatives)))
-        b = (input_heights * input_derivatives
-             - (inputs - input_cumheights) * (input_derivatives
-                                              + input_derivatives_plus_one
-                                              - 2 * input_delta))
-        c = - input_delta * (inputs - input_cumheights)
+        shifted = inputs - input_cumheights
+        a = shifted * slope_sum + input_heights * (input_delta - input_derivatives)
+        b = input_heights * input_derivatives - shifted * slope_sum
+        c = - input_delta * shifted
 
         discriminant = b.pow(2) - 4 * a * c
         assert (discriminant >= 0).all()
 
-        root = (2 * c) / (-b - torch.sqrt(discriminant))
-        outputs = root * input_bin_widths + input_cumwidths
-
-        theta_one_minus_theta = root * (1 - root)
-        denominator = input_delta + ((input_derivatives + input_derivatives_plus_one - 2 * input_delta)
-                                     * theta_one_minus_theta)
-        derivative_numerator = input_delta.pow(2) * (input_derivatives_plus_one * root.pow(2)
-                                                     + 2 * input_delta * theta_one_minus_theta
-                                                     + input_derivatives * (1 - root).pow(2))
-        logabsdet = torch.log(derivative_numerator) - 2 * torch.log(denominator)
-
-        return outputs, -logabsdet
+        theta = (2 * c) / (-b - torch.sqrt(discriminant))
+        outputs = theta * input_bin_widths + input_cumwidths
     else:
         theta = (inputs - input_cumwidths) / input_bin_widths
-        theta_one_minus_theta = theta * (1 - theta)
 
+    theta_one_minus_theta = theta * (1 - theta)
+    denominator = input_delta + slope_sum * theta_one_minus_theta
+    if not inverse:
         numerator = input_heights * (input_delta * theta.pow(2)
                                      + input_derivatives * theta_one_minus_theta)
-        denominator = input_delta + ((input_derivatives + input_derivatives_plus_one - 2 * input_delta)
-                                     * theta_one_minus_theta)
         outputs = input_cumheights + numerator / denominator
 
-        derivative_numerator = input_delta.pow(2) * (input_derivatives_plus_one * theta.pow(2)
-                                                     + 2 * input_delta * theta_one_minus_theta
-                                                     + input_derivatives * (1 - theta).pow(2))
-        logabsdet = torch.log(derivative_numerator) - 2 * torch.log(denominator)
+    derivative_numerator = input_delta.pow(2) * (input_derivatives_plus_one * theta.pow(2)
+                                                 + 2 * input_delta * theta_one_minus_theta
+                                                 + input_derivatives * (1 - theta).pow(2))
+    logabsdet = torch.log(derivative_numerator) - 2 * torch.log(denominator)
 
-        return outputs, logabsdet
+    return outputs, -logabsdet if inverse else logabsdet
@@ -5,6 +5,7 @@ import argparse
 import logging
 import json
 import subprocess
+from collections import namedtuple
 import numpy as np
 from scipy.io.wavfile import read
 import torch
@@ -15,36 +16,74 @@ logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
 logger = logging
 
 
-def load_checkpoint(checkpoint_path, model, optimizer=None, drop_speaker_emb=False):
+CheckpointReport = namedtuple('CheckpointReport', ['missing', 'unexpected', 'mismatched'])
+
+
+def _torch_load(checkpoint_path, mmap=True):
+    """torch.load onto the cpu. With mmap the tensor storages stay in the file
+    and are only paged in when read, so unused entries such as the optimizer
+    state cost nothing."""
+    if mmap:
+        try:
+            return torch.load(checkpoint_path, map_location='cpu', mmap=True)
+        except (TypeError, RuntimeError) as e:
+            # torch < 2.1 has no mmap, and legacy (non-zip) checkpoints can't be mapped
+            logger.info("Memory-mapping '{}' is unavailable, loading it in full: {}".format(checkpoint_path, e))
+    return torch.load(checkpoint_path, map_location='cpu')
+
+
+def load_weights(model, saved_state_dict, drop_speaker_emb=False):
+    """Copy saved weights straight into the parameters and buffers of model.
+    Entries that are missing, unexpected or of the wrong shape are left alone
+    and returned as a CheckpointReport. A smaller speaker embedding table
+    fills the first rows of emb_g."""
+    if hasattr(model, 'module'):
+        model = model.module
+    state_dict = model.state_dict()
+    missing = [k for k in state_dict if k not in saved_state_dict]
+    unexpected = [k for k in saved_state_dict if k not in state_dict]
+    mismatched = []
+    to_load = {}
+    for k, v in saved_state_dict.items():
+        if k not in state_dict:
+            continue
+        target = state_dict[k]
+        if k == 'emb_g.weight':
+            if drop_speaker_emb:
+                continue
+            if v.shape[0] <= target.shape[0] and v.shape[1:] == target.shape[1:]:
+                with torch.no_grad():
+                    target[:v.shape[0]].copy_(v)
+                continue
+        if v.shape != target.shape:
+            mismatched.append("{}: checkpoint {} vs model {}".format(k, tuple(v.shape), tuple(target.shape)))
+            continue
+        to_load[k] = v
+    model.load_state_dict(to_load, strict=False)
+    return CheckpointReport(missing, unexpected, mismatched)
+
+
+def log_checkpoint_report(checkpoint_path, report):
+    if report.missing:
+        logger.warning("{} keys of the model are not in '{}' and keep their initial values: {}".format(
+            len(report.missing), checkpoint_path, ", ".join(report.missing)))
+    if report.unexpected:
+        logger.info("{} keys of '{}' are not used by the model: {}".format(
+            len(report.unexpected), checkpoint_path, ", ".join(report.unexpected)))
+    if report.mismatched:
+        logger.warning("{} keys of '{}' have the wrong shape and were skipped: {}".format(
+            len(report.mismatched), checkpoint_path, "; ".join(report.mismatched)))
+
+
+def load_checkpoint(checkpoint_path, model, optimizer=None, drop_speaker_emb=False, mmap=True):
     assert os.path.isfile(checkpoint_path)
-    checkpoint_dict = torch.load(checkpoint_path, map_location='cpu')
+    checkpoint_dict = _torch_load(checkpoint_path, mmap=mmap)
     iteration = checkpoint_dict['iteration']
     learning_rate = checkpoint_dict['learning_rate']
     if optimizer is not None:
         optimizer.load_state_dict(checkpoint_dict['optimizer'])
-    saved_state_dict = checkpoint_dict['model']
-    if hasattr(model, 'module'):
-        state_dict = model.module.state_dict()
-    else:
-        state_dict = model.state_dict()
-    new_state_dict = {}
-    for k, v in state_dict.items():
-        try:
-            if k == 'emb_g.weight':
-                if drop_speaker_emb:
-                    new_state_dict[k] = v
-                    continue
-                v[:saved_state_dict[k].shape[0], :] = saved_state_dict[k]
-                new_state_dict[k] = v
-            else:
-                new_state_dict[k] = saved_state_dict[k]
-        except:
-            logger.info("%s is not in the checkpoint" % k)
-            new_state_dict[k] = v
-    if hasattr(model, 'module'):
-        model.module.load_state_dict(new_state_dict)
-    else:
-        model.load_state_dict(new_state_dict)
+    report = load_weights(model, checkpoint_dict['model'], drop_speaker_emb)
+    log_checkpoint_report(checkpoint_path, report)
     logger.info("Loaded checkpoint '{}' (iteration {})".format(
         checkpoint_path, iteration))
     return model, optimizer, learning_rate, iteration
@@ -63,6 +102,91 @@ def save_checkpoint(model, optimizer, learning_rate, iteration, checkpoint_path)
                 'learning_rate': learning_rate}, checkpoint_path)
 
 
+def _is_safetensors(checkpoint_path):
+    return str(checkpoint_path).endswith('.safetensors')
+
+
+def checkpoint_source(checkpoint_path):
+    """Identity of the training checkpoint an inference checkpoint is built
+    from: its resolved path, size and modification time."""
+    stat = os.stat(checkpoint_path)
+    return {'path': os.path.realpath(checkpoint_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def save_inference_checkpoint(model, checkpoint_path, iteration=None, source=None):
+    """Save only the weights of a model prepared with prepare_for_inference().
+    source is the checkpoint_source() of the training checkpoint the weights
+    came from, so a later load can tell when that file has changed. A path
+    ending in .safetensors is written in safetensors format (needs the
+    safetensors package)."""
+    if hasattr(model, 'module'):
+        model = model.module
+    logger.info("Saving inference checkpoint to {}".format(checkpoint_path))
+    if _is_safetensors(checkpoint_path):
+        from safetensors.torch import save_file
+        state_dict = {k: v.contiguous() for k, v in model.state_dict().items()}
+        metadata = {'iteration': str(iteration), 'inference_only': 'true'}
+        if source is not None:
+            metadata.update({'source_' + k: str(v) for k, v in source.items()})
+        save_file(state_dict, str(checkpoint_path), metadata=metadata)
+        return
+    torch.save({'model': model.state_dict(),
+                'iteration': iteration,
+                'inference_only': True,
+                'source': source}, checkpoint_path)
+
+
+def _load_safetensors(checkpoint_path):
+    from safetensors import safe_open
+    from safetensors.torch import load_file
+    with safe_open(str(checkpoint_path), framework='pt') as f:
+        metadata = f.metadata() or {}
+    iteration = metadata.get('iteration')
+    return {'model': load_file(str(checkpoint_path), device='cpu'),
+            'iteration': int(iteration) if iteration and iteration.isdigit() else None,
+            'inference_only': metadata.get('inference_only') == 'true',
+            'source': _safetensors_source(metadata)}
+
+
+def _safetensors_source(metadata):
+    if 'source_path' not in metadata:
+        return None
+    return {'path': metadata['source_path'], 'size': int(metadata['source_size']),
+            'mtime_ns': int(metadata['source_mtime_ns'])}
+
+
+def inference_checkpoint_source(checkpoint_path):
+    """The source stored by save_inference_checkpoint, None for files written
+    without one. Reads only the metadata (or the mmapped dict) of the file."""
+    if _is_safetensors(checkpoint_path):
+        from safetensors import safe_open
+        with safe_open(str(checkpoint_path), framework='pt') as f:
+            return _safetensors_source(f.metadata() or {})
+    return _torch_load(checkpoint_path).get('source')
+
+
+def load_inference_checkpoint(checkpoint_path, model, mmap=True):
+    """Load a checkpoint written by save_inference_checkpoint into a model that
+    has already been prepared with prepare_for_inference()."""
+    assert os.path.isfile(checkpoint_path)
+    if _is_safetensors(checkpoint_path):
+        checkpoint_dict = _load_safetensors(checkpoint_path)
+    else:
+        checkpoint_dict = _torch_load(checkpoint_path, mmap=mmap)
+    if not checkpoint_dict.get('inference_only'):
+        raise ValueError("{} is not an inference checkpoint".format(checkpoint_path))
+    if hasattr(model, 'module'):
+        model = model.module
+    report = load_weights(model, checkpoint_dict['model'])
+    log_checkpoint_report(checkpoint_path, report)
+    if report.missing or report.mismatched:
+        raise ValueError("{} does not match the model: {} missing, {} mismatched keys".format(
+            checkpoint_path, len(report.missing), len(report.mismatched)))
+    logger.info("Loaded inference checkpoint '{}' (iteration {})".format(
+        checkpoint_path, checkpoint_dict['iteration']))
+    return model, checkpoint_dict['iteration']
+
+
 def summarize(writer, global_step, scalars={}, histograms={}, images={}, audios={}, audio_sampling_rate=22050):
     for k, v in scalars.items():
         writer.add_scalar(k, v, global_step)
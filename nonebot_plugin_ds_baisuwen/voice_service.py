@@ -1,5 +1,7 @@
 import asyncio
+import multiprocessing
 import os
+import re
 import time
 import numpy as np
 import torch
@@ -8,15 +10,101 @@ import soundfile as sf
 import subprocess
 from pathlib import Path
 from nonebot import get_driver, logger
-from typing import Optional, Tuple
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 import tempfile
-from . import commons
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from . import utils
 from .models import SynthesizerTrn
-from .text import text_to_sequence
+from .model_registry import MIN_SYMBOLS, LoadedModel, ModelRegistry, ModelSpec, VoiceSpec, model_nbytes
+from .inference import (
+    AutocastInfer, CompiledInfer, OnnxInfer, check_onnx_parity, configure_threads,
+    export_onnx, pin_to_cpus, plan_cpu_affinity, quantize_int8
+)
+from .profiling import StageProfiler
+from .text import text_to_sequence_batch
 from .redis_handler import redis_client
 from .config_loader import load_character_config
 
+# int8量化校准用的典型聊天回复
+_CALIBRATION_REPLIES = [
+    "好呀",
+    "不知道呢，要不要试试？",
+    "嗷呜，今天也要一起写代码哦",
+    "呐，你是不是又偷偷熬夜了，尾巴都看见了",
+    "这个问题嘛，就像狼群分工一样，每个函数只做自己的事情，然后把结果交给下一个",
+]
+
+# 分句标点（LLM回复常用空格代替标点，空格同样视为分句点；小数点和版本号中的"."不断开）
+_SENTENCE_SPLIT = re.compile(r'(?<=[，。！？、,!?；;～~…])|(?<=\.)(?!\d)|(\s+)')
+# 句末标点，按时长截断文本时优先在此处断开
+_SENTENCE_END = re.compile(r'[。！？!?；;～~…]|\.(?!\d)')
+# 估算朗读时长用的语速（字/秒，length_scale为1时）
+_CHARS_PER_SECOND = 4.5
+
+
+def _split_sentences(text: str, min_chars: int = 6) -> List[str]:
+    """按标点切分文本，过短的片段连同原分隔符并入前一段，避免符号序列过短"""
+    parts = _SENTENCE_SPLIT.split(text.strip())
+    chunks: List[str] = []
+    seps: List[str] = []
+    for piece, sep in zip(parts[::2], [""] + [p or "" for p in parts[1::2]]):
+        if not piece:
+            continue
+        if chunks and len(chunks[-1]) < min_chars:
+            chunks[-1] += sep + piece
+        else:
+            chunks.append(piece)
+            seps.append(sep)
+    if len(chunks) > 1 and len(chunks[-1]) < min_chars:
+        tail = chunks.pop()
+        chunks[-1] += seps.pop() + tail
+    return chunks
+
+
+def _truncate_text(text: str, max_chars: int) -> str:
+    """截断到max_chars字以内，尽量在句末断开；前半段内没有句末标点时直接截断"""
+    if len(text) <= max_chars:
+        return text
+    # 在全文上匹配，避免把截断处的小数点误认作句号
+    cut = max((m.end() for m in _SENTENCE_END.finditer(text) if m.end() <= max_chars), default=0)
+    return text[:cut] if cut >= max_chars // 2 else text[:max_chars]
+
+
+def _crossfade_concat(chunks: List[np.ndarray], fade_samples: int) -> np.ndarray:
+    """拼接各分句音频，接缝处做线性交叉淡化"""
+    if not chunks:
+        return np.zeros(0, dtype=np.float32)
+    out = chunks[0]
+    for chunk in chunks[1:]:
+        n = min(fade_samples, len(out), len(chunk))
+        if n == 0:
+            out = np.concatenate([out, chunk])
+            continue
+        fade_in = np.linspace(0.0, 1.0, n, dtype=out.dtype)
+        seam = out[-n:] * (1.0 - fade_in) + chunk[:n] * fade_in
+        out = np.concatenate([out[:-n], seam, chunk[n:]])
+    return out
+
+
+def _init_process_worker(cpu_groups, intra_op_threads: int, inter_op_threads: int):
+    """进程工作者初始化：绑定CPU并设置torch线程数"""
+    cpus = cpu_groups.get()
+    if cpus:
+        pin_to_cpus(cpus)
+    configure_threads(intra_op_threads, inter_op_threads)
+    # fork时复制了父进程已有的统计，清空后只回传本进程的样本
+    if voice_service.profiler is not None:
+        voice_service.profiler.reset()
+
+
+def _process_synthesize(text: str, voice: VoiceSpec, seed: Optional[int] = None) -> Tuple[np.ndarray, Optional[dict]]:
+    # fork出的工作进程继承了父进程已加载的模型，之后新加载的模型由各进程自行管理
+    audio = voice_service._synthesize(text, voice, seed)
+    # 各阶段耗时随结果带回主进程汇总
+    profiler = voice_service.profiler
+    return audio, profiler.snapshot(reset=True) if profiler is not None else None
+
+
 class VoiceService:
     def __init__(self):
         driver = get_driver()
@@ -27,41 +115,293 @@ class VoiceService:
         self.api_url = "http://127.0.0.1:7860/run/predict"
         self.timeout = 15  # API超时时间
         
-        # 保持旧模型加载逻辑作为备用
-        self._load_backup_model()
+        # 语音文件目录与SILK编码器
+        self.record_dir = Path(r"D:\gocq\data\record")
+        self.silk_encoder_path = Path(r"D:\silk-v3-decoder-master\silk-v3-decoder-master\windows\silk_v3_encoder.exe").resolve()
+        
+        # 多模型注册表：同一权重只加载一份，超出内存预算时按LRU卸载
+        self.registry = ModelRegistry(
+            self._load_backup_model,
+            memory_budget=int(self.config.get("vits_model_memory_mb", 0)) * 2**20
+        )
+        # 可选的推理分阶段耗时统计，所有torch模型共用
+        self.profiler = StageProfiler() if self.config.get("vits_profile") else None
+
+        # 备用模型在启动后于后台加载，机器人连接不必等待权重读取
+        self._executor = None
+        self._process_pool = False
+        self.state = "pending"  # pending / loading / ready / failed
+        self._ready: Optional[asyncio.Event] = None
+        self._load_task: Optional[asyncio.Task] = None
+        driver.on_startup(self._start_loading)
+        driver.on_shutdown(self._shutdown_workers)
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == "ready"
+
+    async def _start_loading(self):
+        self._ready = asyncio.Event()
+        self._load_task = asyncio.create_task(self._load_in_background())
+
+    async def _load_in_background(self):
+        """在后台线程加载备用模型并启动推理工作者"""
+        self.state = "loading"
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(None, self._load_model)
+        except Exception as e:
+            self.state = "failed"
+            logger.error(f"备用模型不可用，本地语音将降级为仅文字: {str(e)}")
+        else:
+            self.state = "ready"
+            logger.info(f"备用模型就绪，耗时 {time.perf_counter() - start:.1f}s")
+        finally:
+            self._ready.set()
+
+    def _load_model(self):
+        self.registry.get(self.get_voice().model)
+        self._setup_workers()
+
+    def voice_for(self, group_id: Optional[int] = None) -> str:
+        """按群选择音色，未单独配置的群使用角色默认音色"""
+        default = self.config.get("vits_voice", "default")
+        if group_id is None:
+            return default
+        return self.config.get("vits_group_voices", {}).get(str(group_id), default)
+
+    def get_voice(self, name: Optional[str] = None) -> VoiceSpec:
+        """音色配置：vits_voices中的条目，未填写的字段沿用顶层vits_*配置"""
+        name = name or self.config.get("vits_voice", "default")
+        voices: Dict[str, Dict[str, Any]] = self.config.get("vits_voices", {})
+        if name != "default" and name not in voices:
+            logger.warning(f"未配置音色 {name}，使用默认音色")
+            name = "default"
+        entry = voices.get(name, {})
+        if "model_path" in entry:
+            # 独立权重：推理精简版与onnx路径不继承默认模型的
+            model = ModelSpec(
+                model_path=entry["model_path"],
+                config_path=entry.get("config_path", self.config["vits_config_path"]),
+                inference_model_path=entry.get("inference_model_path", ""),
+                onnx_path=entry.get("onnx_path", "")
+            )
+        else:
+            model = ModelSpec(
+                model_path=self.config["vits_model_path"],
+                config_path=self.config["vits_config_path"],
+                inference_model_path=self.config.get("vits_inference_model_path", ""),
+                onnx_path=self.config.get("vits_onnx_path", "")
+            )
+        return VoiceSpec(name, model, entry.get("speaker", self.config.get("vits_speaker", "rosmontic")))
+
+    def _sampling_rate(self, voice: VoiceSpec) -> int:
+        return self.registry.hparams(voice.model.config_path).data.sampling_rate
 
-    def _load_backup_model(self):
+    async def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """等待备用模型加载完成，超时或加载失败返回False"""
+        if self._ready is None:
+            return False
+        if not self._ready.is_set():
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return False
+        return self.is_ready
+
+    def _setup_workers(self):
+        """推理工作者：线程模式共享模型与torch线程池，进程模式（需fork）各自绑定CPU"""
+        workers = max(int(self.config.get("vits_workers", 1)), 1)
+        intra = self.config.get("vits_intra_threads", 0)
+        inter = self.config.get("vits_interop_threads", 0)
+        self._process_pool = False
+        if self.config.get("vits_worker_mode", "thread") == "process":
+            if "fork" in multiprocessing.get_all_start_methods():
+                ctx = multiprocessing.get_context("fork")
+                cpu_groups = ctx.Queue()
+                if self.config.get("vits_cpu_affinity", True):
+                    plan = plan_cpu_affinity(workers, reserve=self.config.get("vits_reserved_cpus", 1))
+                else:
+                    plan = [None] * workers
+                for cpus in plan:
+                    cpu_groups.put(cpus)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=ctx,
+                    initializer=_init_process_worker,
+                    initargs=(cpu_groups, intra, inter)
+                )
+                self._process_pool = True
+                logger.info(f"VITS进程工作者: {workers}个, CPU分组: {plan}")
+                return
+            logger.warning("当前平台不支持fork，进程工作者回退为线程")
+        configure_threads(intra, inter)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="vits")
+
+    async def _shutdown_workers(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    async def _run_synthesis(self, text: str, voice: VoiceSpec, seed: Optional[int] = None) -> np.ndarray:
+        """在推理工作者中合成，避免阻塞事件循环"""
+        if not self.is_ready:
+            raise RuntimeError(f"备用模型未就绪（{self.state}）")
+        loop = asyncio.get_running_loop()
+        if self._process_pool:
+            audio, stages = await loop.run_in_executor(self._executor, _process_synthesize, text, voice, seed)
+            if stages:
+                self.profiler.merge(stages)
+            return audio
+        return await loop.run_in_executor(self._executor, self._synthesize, text, voice, seed)
+
+    def _load_backup_model(self, spec: ModelSpec) -> LoadedModel:
         """备用模型加载（防止API服务未启动）"""
         try:
-            self.vits_model_path = Path(self.config["vits_model_path"])
-            self.vits_config_path = Path(self.config["vits_config_path"])
-            self.hps = utils.get_hparams_from_file(str(self.vits_config_path))
-            self.net_g = SynthesizerTrn(
-                len(self.hps.symbols),
-                self.hps.data.filter_length // 2 + 1,
-                self.hps.train.segment_size // self.hps.data.hop_length,
-                n_speakers=self.hps.data.n_speakers,
-                **self.hps.model
-            ).to(self.device)
-            utils.load_checkpoint(str(self.vits_model_path), self.net_g, None)
-            self.net_g.eval()
+            hps = self.registry.hparams(spec.config_path)
+            frontend = self.registry.frontend(hps)
+
+            # onnxruntime后端：已导出时无需构建torch模型
+            onnx_path = spec.onnx_path
+            use_onnx = self.config.get("vits_backend", "torch") == "onnx"
+            if use_onnx and not onnx_path:
+                logger.warning("未配置onnx路径，回退torch后端")
+                use_onnx = False
+            if use_onnx and self.config.get("vits_seed") is not None:
+                logger.warning("onnx后端的噪声在图内生成，vits_seed不生效，同一文本的音频不保证一致")
+            if use_onnx and Path(onnx_path).exists():
+                infer = self._create_onnx_session(onnx_path)
+                if self._onnx_current(infer, str(spec.model_path)):
+                    logger.warning("备用模型已加载(onnxruntime)，建议优先使用API模式")
+                    return LoadedModel(hps, infer, frontend, nbytes=Path(onnx_path).stat().st_size)
+                logger.warning(f"onnx模型 {onnx_path} 已过期（{spec.model_path} 已更换或为旧版导出），重新导出")
+                del infer
+
+            net_g = SynthesizerTrn(
+                len(hps.symbols),
+                hps.data.filter_length // 2 + 1,
+                hps.train.segment_size // hps.data.hop_length,
+                n_speakers=hps.data.n_speakers,
+                **hps.model
+            )
+            # 推理精简版权重：去掉后验编码器并折叠weight norm
+            inference_path = spec.inference_model_path
+            if self._inference_checkpoint_current(inference_path, str(spec.model_path)):
+                net_g.prepare_for_inference()
+                utils.load_inference_checkpoint(inference_path, net_g)
+            else:
+                _, _, _, iteration = utils.load_checkpoint(str(spec.model_path), net_g, None)
+                net_g.prepare_for_inference()
+                if inference_path:
+                    utils.save_inference_checkpoint(
+                        net_g, inference_path, iteration, source=utils.checkpoint_source(str(spec.model_path)))
+
+            if use_onnx:
+                # 首次使用onnx后端或权重已更换：导出（记录来源权重）并校验与torch模型的数值一致性
+                metadata = self._onnx_metadata(str(spec.model_path)) if Path(spec.model_path).exists() else None
+                export_onnx(net_g, onnx_path, metadata=metadata)
+                infer = self._create_onnx_session(onnx_path)
+                max_diff = check_onnx_parity(net_g, infer)
+                logger.info(f"ONNX导出完成，与torch最大误差: {max_diff:.2e}")
+                if max_diff <= 1e-2:
+                    logger.warning("备用模型已加载(onnxruntime)，建议优先使用API模式")
+                    return LoadedModel(hps, infer, frontend, nbytes=Path(onnx_path).stat().st_size)
+                # 不一致的导出不能留在原路径，否则下次启动会被直接加载
+                del infer
+                rejected = Path(str(onnx_path) + ".rejected")
+                try:
+                    os.replace(onnx_path, rejected)
+                    logger.warning(f"ONNX输出与torch差异过大，已移至 {rejected}，回退torch后端")
+                except OSError as e:
+                    logger.warning(f"ONNX输出与torch差异过大，回退torch后端；移除 {onnx_path} 失败: {e}")
+
+            if self.config.get("vits_quantize") and self.device == "cpu":
+                self._quantize_model(net_g, frontend)
+            net_g.to(self.device)
+            net_g.profiler = self.profiler
+            # 可选编译推理（失败自动回退eager）
+            infer = CompiledInfer(net_g) if self.config.get("vits_compile") else net_g.infer
+            # 可选低精度推理（bf16 autocast，时长与样条变换保持fp32）
+            precision = self.config.get("vits_precision", "fp32")
+            if precision in ("bf16", "fp16"):
+                dtype = torch.bfloat16 if precision == "bf16" else torch.float16
+                infer = AutocastInfer(infer, self.device.split(":")[0], dtype)
             logger.warning("备用模型已加载，建议优先使用API模式")
+            return LoadedModel(hps, infer, frontend, net_g=net_g, device=self.device, nbytes=model_nbytes(net_g))
         except Exception as e:
             logger.error(f"备用模型加载失败: {str(e)}")
+            raise
 
-    async def text_to_speech(self, text: str) -> Optional[Path]:
-        """双模式语音生成（优先API模式）"""
+    @staticmethod
+    def _onnx_metadata(model_path: str) -> Dict[str, str]:
+        """写入onnx模型的来源权重标识（路径、大小、修改时间）"""
+        return {"source_" + k: str(v) for k, v in utils.checkpoint_source(model_path).items()}
+
+    def _onnx_current(self, infer: OnnxInfer, model_path: str) -> bool:
+        """已有的onnx模型由当前的完整权重导出，且时长上限在图内生效；完整权重不存在时直接使用"""
+        if not Path(model_path).exists():
+            return True
+        if not infer.bounded:
+            return False
+        expected = self._onnx_metadata(model_path)
+        return all(infer.metadata.get(k) == v for k, v in expected.items())
+
+    def _inference_checkpoint_current(self, inference_path: str, model_path: str) -> bool:
+        """精简版权重存在且由当前的完整权重生成（路径、大小、修改时间一致）；
+        完整权重不存在时直接使用精简版"""
+        if not inference_path or not Path(inference_path).exists():
+            return False
+        if not Path(model_path).exists():
+            return True
+        try:
+            current = utils.inference_checkpoint_source(inference_path) == utils.checkpoint_source(model_path)
+        except Exception as e:
+            logger.warning(f"无法读取精简版权重 {inference_path}: {str(e)}")
+            return False
+        if not current:
+            logger.warning(f"精简版权重 {inference_path} 不是由当前的 {model_path} 生成，重新生成")
+        return current
+
+    def _quantize_model(self, net_g: SynthesizerTrn, frontend):
+        """CPU int8量化，用典型聊天回复校准声码器"""
+        calibration = []
+        for reply in _CALIBRATION_REPLIES:
+            stn = frontend.encode("[ZH]" + reply + "[ZH]")
+            calibration.append((stn.unsqueeze(0), torch.LongTensor([stn.size(0)]), torch.LongTensor([0])))
+        quantize_int8(net_g, calibration, quantize_resblocks=self.config.get("vits_quantize_resblocks", False))
+        logger.info("VITS模型已量化为int8")
+
+    def _create_onnx_session(self, onnx_path: str) -> OnnxInfer:
+        return OnnxInfer(
+            onnx_path,
+            intra_op_threads=self.config.get("vits_onnx_intra_threads", 0),
+            inter_op_threads=self.config.get("vits_onnx_inter_threads", 1)
+        )
+
+    async def text_to_speech(self, text: str, voice: Optional[str] = None, seed: Optional[int] = None) -> Optional[Path]:
+        """双模式语音生成（优先API模式），voice为vits_voices中的音色名；
+        seed为本地合成的噪声种子，未指定时使用vits_seed"""
+        voice_spec = self.get_voice(voice)
+        if seed is None:
+            seed = self.config.get("vits_seed")
+        clean_text = self._limit_duration(text.replace("\n", " ").strip())
         # 尝试API模式
-        clean_text = text.replace("\n", " ").strip()
         print(clean_text)
-        result = await self._try_api_generate(text)
+        result = await self._try_api_generate(clean_text, voice_spec.speaker)
         if result: return result
         
         # 回退本地模型
         logger.warning("API调用失败，使用备用模型生成")
-        return await self._local_generate(clean_text)
+        if not await self.wait_ready(self.config.get("vits_load_wait", 0)):
+            logger.warning(f"备用模型未就绪（{self.state}），本次仅回复文字")
+            return None
+        if self.config.get("vits_chunked_synthesis"):
+            return await self._local_generate_chunked(clean_text, voice_spec, seed)
+        if self.config.get("vits_streaming_decode"):
+            return await self._local_generate_streaming(clean_text, voice_spec, seed)
+        return await self._local_generate(clean_text, voice_spec, seed)
 
-    async def _try_api_generate(self, text: str, retry=3) -> Optional[Path]:
+    async def _try_api_generate(self, text: str, speaker: Any = "rosmontic", retry=3) -> Optional[Path]:
         """调用本地VITS API服务（增强错误处理）"""
         for attempt in range(retry):
             try:
@@ -70,9 +410,9 @@ class VoiceService:
                     "fn_index": 0,
                     "data": [
                         text, 
-                        "rosmontic", 
+                        str(speaker), 
                         "简体中文",
-                        1.0
+                        self.config.get("vits_length_scale", 1.0)
                     ]
                 }
                 
@@ -142,59 +482,255 @@ class VoiceService:
             # 转换为SILK格式
             with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_wav:
                 sf.write(tmp_wav.name, audio, sr, subtype='PCM_16')
-                return await self._convert_to_silk(audio)
+                return await self._convert_to_silk(audio, sr)
         
         except Exception as e:
             logger.error(f"远程音频处理失败: {str(e)}")
             return None
 
-    async def _local_generate(self, text: str) -> Optional[Path]:
+    async def _local_generate(self, text: str, voice: VoiceSpec, seed: Optional[int] = None) -> Optional[Path]:
         """备用本地模型生成"""
         try:
-            text = "[ZH]" + text + "[ZH]"  # 强制中文标记
-            stn_tst = self._get_text(text)
-            with torch.no_grad():
-                x_tst = stn_tst.unsqueeze(0).to(self.device)
-                x_tst_lengths = torch.LongTensor([stn_tst.size(0)]).to(self.device)
-                sid = torch.LongTensor([0]).to(self.device)
-                audio = self.net_g.infer(x_tst, x_tst_lengths, sid=sid)[0][0,0].cpu().numpy()
-            return await self._convert_to_silk(audio)
+            audio = await self._run_synthesis(text, voice, seed)
+            return await self._convert_to_silk(audio, self._sampling_rate(voice))
         except Exception as e:
             logger.error(f"本地生成失败: {str(e)}")
             return None
 
-    def _get_text(self, text: str):
-        # """文本处理逻辑（增强校验）"""
-        # text = "[ZH]" + text + "[ZH]"
+    async def _local_generate_chunked(self, text: str, voice: VoiceSpec, seed: Optional[int] = None) -> Optional[Path]:
+        """分句合成后交叉淡化拼接"""
+        try:
+            chunks = [audio async for audio in self.iter_speech_chunks(text, voice.name, seed)]
+            sampling_rate = self._sampling_rate(voice)
+            fade_samples = int(sampling_rate * self.config.get("vits_crossfade_ms", 20) / 1000)
+            return await self._convert_to_silk(_crossfade_concat(chunks, fade_samples), sampling_rate)
+        except Exception as e:
+            logger.error(f"分句生成失败: {str(e)}")
+            return None
+
+    async def iter_speech_chunks(self, text: str, voice: Optional[str] = None,
+                                 seed: Optional[int] = None) -> AsyncIterator[np.ndarray]:
+        """按分句顺序产出音频，首句合成完即可使用，后续分句在后台流水线合成；
+        每句都用同一种子单独合成，指定种子时缓存内容与重新合成的结果一致"""
+        voice_spec = self.get_voice(voice)
+        semaphore = asyncio.Semaphore(self.config.get("vits_chunk_workers", 1))
+
+        async def synthesize(chunk: str) -> np.ndarray:
+            key = f"{voice_spec.name}:{chunk}" if seed is None else f"{voice_spec.name}:seed={seed}:{chunk}"
+            cached = await self._get_cached_chunk(key)
+            if cached is not None:
+                return cached
+            async with semaphore:
+                audio = await self._run_synthesis(chunk, voice_spec, seed)
+            await self._cache_chunk(key, audio)
+            return audio
+
+        tasks = [asyncio.ensure_future(synthesize(chunk)) for chunk in _split_sentences(text)]
+        try:
+            for task in tasks:
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _get_cached_chunk(self, chunk: str) -> Optional[np.ndarray]:
+        try:
+            data = await redis_client.get_cached_voice(f"chunk:{chunk}")
+        except Exception as e:
+            logger.warning(f"语音缓存读取失败: {str(e)}")
+            return None
+        return np.frombuffer(data, dtype=np.float32) if data else None
+
+    async def _cache_chunk(self, chunk: str, audio: np.ndarray):
+        try:
+            await redis_client.cache_voice(f"chunk:{chunk}", audio.astype(np.float32).tobytes())
+        except Exception as e:
+            logger.warning(f"语音缓存写入失败: {str(e)}")
+
+    def stage_metrics(self) -> Dict[str, Dict[str, dict]]:
+        """本地推理各阶段（enc_p/dp/generate_path/flow/dec）的耗时与显存峰值直方图摘要，
+        未开启vits_profile时为空"""
+        return self.profiler.summary() if self.profiler is not None else {}
+
+    def _limit_duration(self, text: str) -> str:
+        """按vits_max_duration估算可朗读的字数并截断文本，超长回复不再按全文合成"""
+        max_seconds = self.config.get("vits_max_duration", 0)
+        if max_seconds <= 0:
+            return text
+        max_chars = max(int(max_seconds * _CHARS_PER_SECOND / self.config.get("vits_length_scale", 1.0)), 1)
+        truncated = _truncate_text(text, max_chars)
+        if len(truncated) < len(text):
+            logger.info(f"回复超出语音时长上限 {max_seconds}s，仅合成前 {len(truncated)}/{len(text)} 字")
+        return truncated
+
+    def _infer_kwargs(self, model: LoadedModel) -> dict:
+        """推理参数：语速、噪声强度，以及由vits_max_duration换算的最大帧数"""
+        kwargs = {
+            "length_scale": self.config.get("vits_length_scale", 1.0),
+            "noise_scale": self.config.get("vits_noise_scale", 1.0),
+            "noise_scale_w": self.config.get("vits_noise_scale_w", 1.0),
+        }
+        max_seconds = self.config.get("vits_max_duration", 0)
+        if max_seconds > 0:
+            data = model.hps.data
+            kwargs["max_len"] = max(int(max_seconds * data.sampling_rate / data.hop_length), 1)
+        return kwargs
+
+    @staticmethod
+    def _generator(seed: Optional[int]) -> Optional[torch.Generator]:
+        """按种子创建噪声生成器；噪声在CPU上生成，同一种子在任何设备上结果相同"""
+        return None if seed is None else torch.Generator().manual_seed(int(seed))
+
+    def _synthesize(self, text: str, voice: VoiceSpec, seed: Optional[int] = None) -> np.ndarray:
+        """单段文本本地推理，返回波形"""
+        model = self.registry.get(voice.model)
+        text = "[ZH]" + text + "[ZH]"  # 强制中文标记
+        stn_tst = self._get_text(text, model)
+        with torch.no_grad():
+            x_tst = stn_tst.unsqueeze(0).to(model.device)
+            x_tst_lengths = torch.LongTensor([stn_tst.size(0)]).to(model.device)
+            sid = torch.LongTensor([model.speaker_id(voice.speaker)]).to(model.device)
+            return model.infer(
+                x_tst, x_tst_lengths, sid=sid, generator=self._generator(seed), **self._infer_kwargs(model)
+            )[0][0,0].cpu().numpy()
+
+    def _get_text(self, text: str, model: LoadedModel):
+        """文本处理逻辑（增强校验），结果缓存在同符号表模型共用的前端中"""
         logger.debug(f"原始文本: {text}")
-        text_norm = text_to_sequence(
-            text, 
-            self.hps.symbols, 
-            self.hps.data.text_cleaners
-        )
-        
-        # 长度校验
-        if len(text_norm) < 3:
-            raise ValueError(f"符号序列过短（{len(text_norm)}）")
-        
+        text_norm = model.frontend.encode(text)
         logger.debug(f"处理后的符号序列长度: {len(text_norm)}")
-        if self.hps.data.add_blank:
-            text_norm = commons.intersperse(text_norm, 0)
-        return torch.LongTensor(text_norm)
+        return text_norm
+
+    def _get_text_batch(self, texts: List[str], model: LoadedModel, num_workers: int = 1):
+        """批量文本处理：返回按长度降序排列的填充序列、长度与原始顺序索引"""
+        return text_to_sequence_batch(
+            texts,
+            model.hps.symbols,
+            model.hps.data.text_cleaners,
+            add_blank=model.hps.data.add_blank,
+            num_workers=num_workers
+        )
+
+    def _synthesize_batch(self, texts: List[str], voice: Optional[str] = None, num_workers: int = 1,
+                          seed: Optional[int] = None) -> List[np.ndarray]:
+        """批量本地合成（离线缓存预生成等场景），结果按输入顺序返回；
+        与_synthesize相同的长度校验与推理参数，每句使用各自的种子生成器，指定种子时与单句合成结果一致"""
+        voice_spec = self.get_voice(voice)
+        model = self.registry.get(voice_spec.model)
+        x, x_lengths, order = self._get_text_batch(
+            ["[ZH]" + text + "[ZH]" for text in texts], model, num_workers
+        )
+        for row, i in enumerate(order.tolist()):
+            length = int(x_lengths[row])
+            symbols = (length - 1) // 2 if model.hps.data.add_blank else length
+            if symbols < MIN_SYMBOLS:
+                raise ValueError(f"第{i + 1}句符号序列过短（{symbols}）: {texts[i]}")
+        if seed is None:
+            seed = self.config.get("vits_seed")
+        generator = None if seed is None else [self._generator(seed) for _ in range(x.size(0))]
+        hop_length = model.hps.data.hop_length
+        results: List[Optional[np.ndarray]] = [None] * len(texts)
+        with torch.no_grad():
+            sid = torch.full((x.size(0),), model.speaker_id(voice_spec.speaker), dtype=torch.long, device=model.device)
+            o, _, y_mask, _ = model.infer(x.to(model.device), x_lengths.to(model.device), sid=sid,
+                                          generator=generator, **self._infer_kwargs(model))
+            audio_lengths = (y_mask.sum([1, 2]).long() * hop_length).tolist()
+            audio = o[:, 0].cpu().numpy()
+        for row, i in enumerate(order.tolist()):
+            results[i] = audio[row, :audio_lengths[row]]
+        return results
 
-    async def _convert_to_silk(self, audio: np.ndarray) -> Optional[Path]:
-        temp_dir = Path(r"D:\gocq\data\record")
-        encoder_path = Path(r"D:\silk-v3-decoder-master\silk-v3-decoder-master\windows\silk_v3_encoder.exe").resolve()
+    async def _local_generate_streaming(self, text: str, voice: VoiceSpec, seed: Optional[int] = None) -> Optional[Path]:
+        """流式解码：声码器逐块输出的同时由ffmpeg转码，长回复无需等待整段合成完毕"""
+        temp_pcm = None
+        try:
+            if not self.record_dir.exists():
+                self.record_dir.mkdir(parents=True, exist_ok=True)
+            timestamp = int(time.time() * 1000)
+            temp_pcm = self.record_dir / f"temp_{timestamp}.pcm"
+            temp_silk = self.record_dir / f"temp_{timestamp}.silk"
+
+            loop = asyncio.get_running_loop()
+            # 流式解码需在本进程内逐块读取模型输出
+            executor = None if self._process_pool else self._executor
+            await loop.run_in_executor(executor, self._stream_to_pcm, text, voice, temp_pcm, seed)
+            return await self._encode_silk(temp_pcm, temp_silk)
+        except subprocess.CalledProcessError as e:
+            self._log_subprocess_error(e)
+            return None
+        except Exception as e:
+            logger.error(f"流式生成失败: {str(e)}")
+            return None
+        finally:
+            if temp_pcm and temp_pcm.exists():
+                try:
+                    temp_pcm.unlink(missing_ok=True)
+                except Exception as e:
+                    logger.warning(f"清理失败 {temp_pcm}: {str(e)}")
+
+    def _stream_to_pcm(self, text: str, voice: VoiceSpec, temp_pcm: Path, seed: Optional[int] = None):
+        """将流式合成的音频块直接写入ffmpeg标准输入，转为24k PCM"""
+        ffmpeg_cmd = [
+            "ffmpeg", "-y",
+            "-f", "f32le",
+            "-ar", str(self._sampling_rate(voice)),
+            "-ac", "1",
+            "-i", "pipe:0",
+            "-ar", "24000",
+            "-ac", "1",
+            "-f", "s16le",
+            "-loglevel", "error",
+            str(temp_pcm)
+        ]
+        proc = subprocess.Popen(
+            ffmpeg_cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        try:
+            for block in self._synthesize_stream(text, voice, seed):
+                proc.stdin.write(block.astype(np.float32).tobytes())
+            proc.stdin.close()
+            _, stderr = proc.communicate(timeout=15)
+        except BaseException:
+            proc.kill()
+            raise
+        if proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, ffmpeg_cmd, stderr=stderr)
+        if not temp_pcm.exists():
+            raise RuntimeError("PCM文件生成失败")
+
+    def _synthesize_stream(self, text: str, voice: VoiceSpec, seed: Optional[int] = None):
+        """单段文本流式推理，逐块产出波形（onnxruntime后端不支持流式，整段产出）"""
+        model = self.registry.get(voice.model)
+        if model.net_g is None:
+            yield self._synthesize(text, voice, seed)
+            return
+        text = "[ZH]" + text + "[ZH]"  # 强制中文标记
+        stn_tst = self._get_text(text, model)
+        with torch.no_grad():
+            x_tst = stn_tst.unsqueeze(0).to(model.device)
+            x_tst_lengths = torch.LongTensor([stn_tst.size(0)]).to(model.device)
+            sid = torch.LongTensor([model.speaker_id(voice.speaker)]).to(model.device)
+            for block in model.net_g.infer_stream(
+                x_tst, x_tst_lengths, sid=sid,
+                chunk_size=self.config.get("vits_stream_chunk_frames", 64),
+                generator=self._generator(seed),
+                **self._infer_kwargs(model)
+            ):
+                yield block[0, 0].cpu().numpy()
+
+    async def _convert_to_silk(self, audio: np.ndarray, sampling_rate: int) -> Optional[Path]:
+        temp_dir = self.record_dir
         
         # 初始化所有路径变量为 None
         temp_wav = temp_pcm = temp_silk = None
         
         try:
-            # ==== 1. 验证目录和编码器 ====
+            # ==== 1. 验证目录 ====
             if not temp_dir.exists():
                 temp_dir.mkdir(parents=True, exist_ok=True)
-            if not encoder_path.exists():
-                raise FileNotFoundError(f"SILK编码器不存在: {encoder_path}")
 
             # ==== 2. 生成唯一时间戳 ====
             timestamp = int(time.time() * 1000)
@@ -204,7 +740,7 @@ class VoiceService:
 
             # ==== 3. 保存WAV文件 ====
             logger.debug(f"保存WAV文件到: {temp_wav}")
-            sf.write(str(temp_wav), audio, self.hps.data.sampling_rate, subtype='PCM_16')
+            sf.write(str(temp_wav), audio, sampling_rate, subtype='PCM_16')
 
             # ==== 4. 转换PCM ====
             logger.debug("开始转换WAV到PCM...")
@@ -230,46 +766,10 @@ class VoiceService:
                 raise RuntimeError("PCM文件生成失败")
 
             # ==== 6. SILK编码 ====
-            logger.debug("开始SILK编码...")
-            cmd = [
-                str(encoder_path),
-                str(temp_pcm),
-                str(temp_silk),
-                "-Fs_API", "24000",
-                "-rate", "24000",
-                "-tencent",
-                "-quiet"
-            ]
-            result = subprocess.run(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                timeout=15,
-                check=True,
-                shell=False
-            )
-
-            # ==== 7. 验证SILK文件 ====
-            retry_count = 0
-            while not temp_silk.exists() and retry_count < 10:
-                logger.debug(f"等待文件生成，重试次数: {retry_count}")
-                await asyncio.sleep(0.5)
-                retry_count += 1
-
-            if not temp_silk.exists():
-                raise FileNotFoundError(f"SILK文件未生成: {temp_silk}")
-            if temp_silk.stat().st_size < 1024:
-                raise ValueError(f"SILK文件大小异常: {temp_silk.stat().st_size}字节")
-
-            return temp_silk
+            return await self._encode_silk(temp_pcm, temp_silk)
 
         except subprocess.CalledProcessError as e:
-            error_msg = f"""
-            子进程错误[code={e.returncode}]
-            命令: {' '.join(e.cmd)}
-            错误输出: {e.stderr.decode('gbk', errors='ignore')}
-            """
-            logger.error(error_msg)
+            self._log_subprocess_error(e)
             return None
         except Exception as e:
             logger.error(f"编码失败: {str(e)}")
@@ -283,4 +783,51 @@ class VoiceService:
                     except Exception as e:
                         logger.warning(f"清理失败 {f}: {str(e)}")
 
+    async def _encode_silk(self, temp_pcm: Path, temp_silk: Path) -> Path:
+        """PCM转SILK并校验输出文件"""
+        encoder_path = self.silk_encoder_path
+        if not encoder_path.exists():
+            raise FileNotFoundError(f"SILK编码器不存在: {encoder_path}")
+
+        logger.debug("开始SILK编码...")
+        cmd = [
+            str(encoder_path),
+            str(temp_pcm),
+            str(temp_silk),
+            "-Fs_API", "24000",
+            "-rate", "24000",
+            "-tencent",
+            "-quiet"
+        ]
+        subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=15,
+            check=True,
+            shell=False
+        )
+
+        # 验证SILK文件
+        retry_count = 0
+        while not temp_silk.exists() and retry_count < 10:
+            logger.debug(f"等待文件生成，重试次数: {retry_count}")
+            await asyncio.sleep(0.5)
+            retry_count += 1
+
+        if not temp_silk.exists():
+            raise FileNotFoundError(f"SILK文件未生成: {temp_silk}")
+        if temp_silk.stat().st_size < 1024:
+            raise ValueError(f"SILK文件大小异常: {temp_silk.stat().st_size}字节")
+
+        return temp_silk
+
+    def _log_subprocess_error(self, e: subprocess.CalledProcessError):
+        error_msg = f"""
+            子进程错误[code={e.returncode}]
+            命令: {' '.join(e.cmd)}
+            错误输出: {(e.stderr or b'').decode('gbk', errors='ignore')}
+            """
+        logger.error(error_msg)
+
 voice_service = VoiceService()
\ No newline at end of file
@@ -0,0 +1,61 @@
+import sys
+import types
+from pathlib import Path
+
+import pytest
+import torch
+
+ROOT = Path(__file__).resolve().parent.parent
+PACKAGE = "nonebot_plugin_ds_baisuwen"
+# 参考实现（改写前的数值路径）保存在benchmarks脚本里，测试直接导入它们
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+# 插件的__init__需要运行中的NoneBot；模型测试只把插件注册为裸包，不执行__init__
+if PACKAGE not in sys.modules:
+    _pkg = types.ModuleType(PACKAGE)
+    _pkg.__path__ = [str(ROOT / PACKAGE)]
+    sys.modules[PACKAGE] = _pkg
+
+# 缩小版的sample_config结构，保证每个测试在CPU上几秒内跑完
+TINY_MODEL = dict(
+    inter_channels=32,
+    hidden_channels=32,
+    filter_channels=64,
+    n_heads=2,
+    n_layers=2,
+    kernel_size=3,
+    p_dropout=0.1,
+    resblock="1",
+    resblock_kernel_sizes=[3, 7],
+    resblock_dilation_sizes=[[1, 3, 5], [1, 3, 5]],
+    upsample_rates=[4, 4],
+    upsample_initial_channel=64,
+    upsample_kernel_sizes=[8, 8],
+    n_layers_q=2,
+    gin_channels=16,
+)
+N_VOCAB = 40
+
+
+@pytest.fixture
+def build_model():
+    """随机初始化的小型SynthesizerTrn（eval模式），关键字参数覆盖TINY_MODEL"""
+    from nonebot_plugin_ds_baisuwen.models import SynthesizerTrn
+
+    def build(seed=0, n_speakers=2, **overrides):
+        torch.manual_seed(seed)
+        net_g = SynthesizerTrn(N_VOCAB, 65, 16, n_speakers=n_speakers, **{**TINY_MODEL, **overrides})
+        return net_g.eval()
+    return build
+
+
+@pytest.fixture
+def sample_inputs():
+    """形如text_to_sequence输出的随机符号序列"""
+    def inputs(length, batch=1, seed=0):
+        generator = torch.Generator().manual_seed(seed)
+        x = torch.randint(1, N_VOCAB, (batch, length), generator=generator)
+        x_lengths = torch.full((batch,), length, dtype=torch.long)
+        sid = torch.zeros(batch, dtype=torch.long)
+        return x, x_lengths, sid
+    return inputs
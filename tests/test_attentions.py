@@ -0,0 +1,25 @@
+import copy
+
+import pytest
+import torch
+from torch import nn
+
+from nonebot_plugin_ds_baisuwen.attentions import MultiHeadAttention
+
+
+@pytest.mark.parametrize("length", [3, 9, 64])
+def test_banded_attention_matches_reference(length):
+    torch.manual_seed(0)
+    banded = MultiHeadAttention(32, 32, 2, p_dropout=0.1, window_size=4).eval()
+    # 参考路径即训练路径，去掉dropout后两者可比
+    reference = copy.deepcopy(banded).train()
+    reference.drop = nn.Identity()
+
+    x = torch.randn(2, 32, length)
+    lengths = torch.LongTensor([length, max(length * 2 // 3, 1)])
+    x_mask = (torch.arange(length)[None, :] < lengths[:, None]).unsqueeze(1).float()
+    attn_mask = x_mask.unsqueeze(2) * x_mask.unsqueeze(-1)
+    with torch.no_grad():
+        expected = reference(x, x, attn_mask) * x_mask
+        actual = banded(x, x, attn_mask) * x_mask
+    torch.testing.assert_close(actual, expected, atol=1e-5, rtol=1e-5)
@@ -0,0 +1,34 @@
+import torch
+
+from nonebot_plugin_ds_baisuwen import commons
+
+
+def dense_expand(x, duration, t_y):
+    x_mask = (duration > 0).to(x.dtype)
+    y_mask = commons.sequence_mask(duration.sum([1, 2]).long(), t_y).unsqueeze(1).to(x.dtype)
+    attn = commons.generate_path(duration, x_mask.unsqueeze(2) * y_mask.unsqueeze(-1))
+    return torch.matmul(attn.squeeze(1), x.transpose(1, 2)).transpose(1, 2)
+
+
+def test_expand_by_duration_matches_generate_path():
+    generator = torch.Generator().manual_seed(0)
+    x = torch.randn(3, 8, 20, generator=generator)
+    duration = torch.randint(0, 6, (3, 1, 20), generator=generator).float()
+    duration[1:, :, 12:] = 0  # 填充部分
+    t_y = int(duration.sum([1, 2]).max())
+    expected = dense_expand(x, duration, t_y)
+    actual = commons.expand_by_duration(x, duration, t_y)
+    torch.testing.assert_close(actual, expected, atol=0, rtol=0)
+    # 内存布局与matmul结果一致，randn_like才会抽到相同的噪声
+    assert actual.stride() == expected.stride()
+
+
+def test_infer_noise_matches_dense_path(build_model, sample_inputs):
+    net_g = build_model().prepare_for_inference()
+    x, x_lengths, sid = sample_inputs(16, batch=2)
+    with torch.no_grad():
+        torch.manual_seed(0)
+        dense = net_g.infer(x, x_lengths, sid=sid, return_attn=True)[0]
+        torch.manual_seed(0)
+        gathered = net_g.infer(x, x_lengths, sid=sid)[0]
+    torch.testing.assert_close(gathered, dense, atol=0, rtol=0)
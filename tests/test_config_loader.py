@@ -0,0 +1,22 @@
+import pytest
+
+from nonebot_plugin_ds_baisuwen import config_loader
+
+DEFAULTS = {"vits_length_scale": 1.0, "vits_max_duration": 0}
+
+
+@pytest.mark.parametrize("key, value", [
+    ("vits_length_scale", 0),
+    ("vits_length_scale", -1.2),
+    ("vits_length_scale", "1.0"),
+    ("vits_max_duration", -5),
+    ("vits_max_duration", None),
+])
+def test_invalid_vits_values_fall_back(key, value):
+    config = config_loader._check_vits_config({**DEFAULTS, key: value}, DEFAULTS)
+    assert config[key] == DEFAULTS[key]
+
+
+def test_valid_vits_values_are_kept():
+    config = {"vits_length_scale": 0.8, "vits_max_duration": 12.5}
+    assert config_loader._check_vits_config(dict(config), DEFAULTS) == config
@@ -0,0 +1,44 @@
+import pytest
+
+pytest.importorskip("nonebot")
+
+from nonebot_plugin_ds_baisuwen import model_registry
+from nonebot_plugin_ds_baisuwen.utils import HParams
+
+
+class _Logger:
+    def __init__(self):
+        self.warnings = []
+
+    def warning(self, message):
+        self.warnings.append(message)
+
+
+def loaded_model(n_speakers, speakers=None):
+    config = {"data": {"n_speakers": n_speakers}}
+    if speakers is not None:
+        config["speakers"] = speakers
+    return model_registry.LoadedModel(HParams(**config), infer=None, frontend=None)
+
+
+def test_speaker_names_resolve(monkeypatch):
+    monkeypatch.setattr(model_registry, "logger", _Logger())
+    model = loaded_model(3, ["a", "b", "c"])
+    assert [model.speaker_id(s) for s in ("b", 2, "1")] == [1, 2, 1]
+    assert loaded_model(3, {"a": 0, "b": 5}).speaker_id("b") == 5
+
+
+def test_unknown_speaker_warns_once(monkeypatch):
+    log = _Logger()
+    monkeypatch.setattr(model_registry, "logger", log)
+    model = loaded_model(3, ["a", "b", "c"])
+    assert [model.speaker_id("rosmontic") for _ in range(3)] == [0, 0, 0]
+    assert len(log.warnings) == 1
+
+
+def test_single_speaker_falls_back_silently(monkeypatch):
+    log = _Logger()
+    monkeypatch.setattr(model_registry, "logger", log)
+    model = loaded_model(0)
+    assert model.speaker_id("rosmontic") == 0
+    assert log.warnings == []
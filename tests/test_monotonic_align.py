@@ -0,0 +1,52 @@
+import importlib
+
+import numpy as np
+import pytest
+import torch
+
+from nonebot_plugin_ds_baisuwen.monotonic_align import MaximumPath, maximum_path
+from nonebot_plugin_ds_baisuwen.monotonic_align.numpy_core import maximum_path_c as numpy_maximum_path
+from nonebot_plugin_ds_baisuwen.profiling import StageProfiler
+
+
+@pytest.mark.parametrize("name", ["core", "numba_core"])
+def test_backends_match_numpy(name):
+    try:
+        backend = importlib.import_module("nonebot_plugin_ds_baisuwen.monotonic_align." + name).maximum_path_c
+    except ImportError as e:
+        pytest.skip(f"{name} unavailable: {e}")
+    rng = np.random.default_rng(0)
+    # t_x == t_y、单帧、单字符等边界与普通形状
+    for t_y_max, t_x_max in [(1, 1), (5, 5), (7, 1), (60, 20)]:
+        t_ys = rng.integers(1, t_y_max + 1, 4).astype(np.int32)
+        t_xs = np.minimum(rng.integers(1, t_x_max + 1, 4), t_ys).astype(np.int32)
+        values = rng.standard_normal((4, t_y_max, t_x_max)).astype(np.float32) * 10
+        expected = np.zeros(values.shape, dtype=np.int32)
+        numpy_maximum_path(expected, values.copy(), t_ys, t_xs)
+        paths = np.zeros(values.shape, dtype=np.int32)
+        backend(paths, values.copy(), t_ys, t_xs)
+        np.testing.assert_array_equal(paths, expected)
+
+
+@pytest.mark.parametrize("shape", [(2, 12, 5), (4, 200, 60)])
+def test_maximum_path_buffered_matches(shape):
+    generator = torch.Generator().manual_seed(0)
+    neg_cent = torch.randn(shape, generator=generator) * 10
+    mask = torch.zeros(shape)
+    mask[0] = 1
+    mask[1:, :shape[1] // 2, :shape[2] // 2] = 1  # padded items
+    expected = maximum_path(neg_cent, mask)
+    buffered = MaximumPath()
+    for _ in range(2):  # the second call reuses the buffers
+        torch.testing.assert_close(buffered(neg_cent, mask), expected, atol=0, rtol=0)
+        torch.testing.assert_close(buffered(neg_cent.clone(), mask, inplace=True), expected, atol=0, rtol=0)
+
+
+def test_training_alignment_is_profiled(build_model, sample_inputs):
+    net_g = build_model().train()
+    net_g.profiler = StageProfiler()
+    x, x_lengths, sid = sample_inputs(12, batch=2)
+    y = torch.randn(2, 65, 40)
+    y_lengths = torch.LongTensor([40, 30])
+    net_g(x, x_lengths, y, y_lengths, sid=sid)
+    assert net_g.profiler.summary()["maximum_path"]["time_ms"]["count"] == 1
@@ -0,0 +1,25 @@
+import pytest
+import torch
+
+pytest.importorskip("onnxruntime")
+
+from nonebot_plugin_ds_baisuwen.inference import OnnxInfer, check_onnx_parity, export_onnx
+
+
+def test_onnx_max_len_bounds_the_graph(build_model, sample_inputs, tmp_path):
+    net_g = build_model().prepare_for_inference()
+    export_onnx(net_g, tmp_path / "model.onnx")
+    infer = OnnxInfer(tmp_path / "model.onnx")
+    assert infer.bounded
+    assert check_onnx_parity(net_g, infer) < 1e-4
+
+    x, x_lengths, sid = sample_inputs(32)
+    for max_len in (None, 10):
+        with torch.no_grad():
+            expected, _, expected_mask, _ = net_g.infer(
+                x, x_lengths, sid=sid, noise_scale=0., noise_scale_w=0., max_len=max_len)
+        audio, _, y_mask, _ = infer(x, x_lengths, sid=sid, noise_scale=0., noise_scale_w=0., max_len=max_len)
+        # 时长在图内截断：y_mask本身就只有max_len帧，而不是整段合成后再切片
+        assert y_mask.shape == expected_mask.shape
+        torch.testing.assert_close(audio, expected, atol=1e-4, rtol=0)
+    assert y_mask.size(2) == 10
@@ -0,0 +1,22 @@
+import pytest
+import torch
+
+from nonebot_plugin_ds_baisuwen.inference import quantize_int8
+
+
+@pytest.mark.parametrize("quantize_resblocks", [False, True])
+def test_stream_quantized_generator(build_model, sample_inputs, quantize_resblocks):
+    net_g = build_model().prepare_for_inference()
+    reference_field = net_g.dec.receptive_field()
+    quantize_int8(net_g, [sample_inputs(16)], quantize_resblocks=quantize_resblocks)
+    dec = net_g.dec
+    # 量化包装不改变卷积的几何参数
+    assert dec.receptive_field() == reference_field
+
+    torch.manual_seed(0)
+    z = torch.randn(1, 32, 40)
+    g = net_g.emb_g(torch.zeros(1, dtype=torch.long)).unsqueeze(-1)
+    with torch.no_grad():
+        full = dec(z, g=g)
+        streamed = torch.cat(list(dec.stream(z, g=g, chunk_size=8)), dim=2)
+    torch.testing.assert_close(streamed, full, atol=1e-4, rtol=0)
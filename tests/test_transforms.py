@@ -0,0 +1,30 @@
+import pytest
+import torch
+
+from bench_spline import make_inputs, reference_spline
+from nonebot_plugin_ds_baisuwen import transforms
+
+TAIL_BOUND = 5.0
+
+
+@pytest.mark.parametrize("inverse", [False, True])
+def test_spline_matches_reference(inverse):
+    # 两种实现都在fp64下运行：比较的是算法本身，不受fp32舍入（logabsdet约3e-5）影响；
+    # piecewise_rational_quadratic_transform总是转成fp32，所以直接调用样条函数
+    x, w, h, d = (t.double() for t in make_inputs(2, 64, 10, TAIL_BOUND, seed=0))
+    outputs, logabsdet = transforms.unconstrained_rational_quadratic_spline(
+        x, w, h, d, inverse=inverse, tails="linear", tail_bound=TAIL_BOUND)
+    expected, expected_logabsdet = reference_spline(x, w, h, d, inverse=inverse, tail_bound=TAIL_BOUND)
+    torch.testing.assert_close(outputs, expected, atol=1e-5, rtol=0)
+    torch.testing.assert_close(logabsdet, expected_logabsdet, atol=1e-5, rtol=0)
+
+
+def test_spline_round_trip():
+    x, w, h, d = make_inputs(2, 64, 10, TAIL_BOUND, seed=1)
+    y, logabsdet = transforms.piecewise_rational_quadratic_transform(
+        x, w, h, d, tails="linear", tail_bound=TAIL_BOUND)
+    x_back, inverse_logabsdet = transforms.piecewise_rational_quadratic_transform(
+        y, w, h, d, inverse=True, tails="linear", tail_bound=TAIL_BOUND)
+    # fp32：容差按舍入误差放宽
+    torch.testing.assert_close(x_back, x, atol=1e-4, rtol=1e-4)
+    torch.testing.assert_close(inverse_logabsdet, -logabsdet, atol=1e-4, rtol=1e-4)
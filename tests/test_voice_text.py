@@ -0,0 +1,27 @@
+import importlib
+
+import pytest
+
+nonebot = pytest.importorskip("nonebot")
+
+
+@pytest.fixture(scope="module")
+def voice_service():
+    # voice_service连接驱动并读取配置，只需无适配器的驱动；redis仅在缓存时访问
+    nonebot.init(driver="~none", redis_url="redis://127.0.0.1:6379/0")
+    # 包的__init__把voice_service重新绑定为服务实例，这里要的是模块
+    return importlib.import_module("nonebot_plugin_ds_baisuwen.voice_service")
+
+
+def test_split_keeps_decimals(voice_service):
+    chunks = voice_service._split_sentences("圆周率大约是3.14，版本号是1.2.0。我们明天再聊吧.好的")
+    assert chunks == ["圆周率大约是3.14，", "版本号是1.2.0。", "我们明天再聊吧.好的"]
+    assert "".join(chunks) == "圆周率大约是3.14，版本号是1.2.0。我们明天再聊吧.好的"
+
+
+def test_split_on_ascii_period(voice_service):
+    assert voice_service._split_sentences("今天天气很好.我们去公园散步吧.") == ["今天天气很好.", "我们去公园散步吧."]
+
+
+def test_truncate_keeps_decimals(voice_service):
+    assert voice_service._truncate_text("价格是3.5元。后面还有很长很长的一句话", 8) == "价格是3.5元。"
@@ -0,0 +1,20 @@
+import pytest
+import torch
+
+from nonebot_plugin_ds_baisuwen.modules import WN
+
+
+@pytest.mark.parametrize("gin_channels", [0, 16])
+def test_wn_inference_path_matches_forward(gin_channels):
+    torch.manual_seed(0)
+    wn = WN(32, 5, 1, 4, gin_channels=gin_channels)
+    wn.remove_weight_norm()
+    x = torch.randn(2, 32, 50)
+    x_mask = torch.ones(2, 1, 50)
+    x_mask[1, :, 30:] = 0
+    g = torch.randn(2, gin_channels, 1) if gin_channels else None
+    with torch.no_grad():
+        # train模式走常规forward（WN此处无dropout），eval且无梯度时走_infer
+        expected = wn.train()(x, x_mask, g=g)
+        actual = wn.eval()(x, x_mask, g=g)
+    torch.testing.assert_close(actual, expected, atol=1e-6, rtol=1e-5)